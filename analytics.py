@@ -1,97 +1,218 @@
 import pandas as pd
 import json
 import numpy as np
+from collections import defaultdict
 from datetime import datetime, timedelta
 import os
+import types
+
+import store
+import schema
+import props
+import taxlots
 
 try:
     from pyxirr import xirr
 except ImportError:
     xirr = None
 
-def calculate_analytics(gains_csv, realized_csv, nav_history_csv, props_csv):
-    if not os.path.exists(gains_csv):
-        return None
-    
-    # 1. LOAD DATA
-    unified_df = pd.read_csv(gains_csv) # mf_gains_v2.csv
-    if 'isin' in unified_df.columns and 'ISIN' in unified_df.columns:
-        unified_df = unified_df.loc[:, ~unified_df.columns.duplicated()]
-        if 'isin' in unified_df.columns: unified_df = unified_df.drop(columns=['isin'])
-    unified_df['Date'] = pd.to_datetime(unified_df['Date'], format='mixed')
-
-    cams_path = 'data/cams_mf.csv'
-    cams_df = pd.read_csv(cams_path)
-    cams_df['Date'] = pd.to_datetime(cams_df['Date'], dayfirst=True, format='mixed')
-    
-    realized_df = pd.DataFrame()
-    if os.path.exists(realized_csv):
-        realized_df = pd.read_csv(realized_csv)
-        realized_df['Buy Date'] = pd.to_datetime(realized_df['Buy Date'])
-        realized_df['Sell Date'] = pd.to_datetime(realized_df['Sell Date'])
-    
-    nav_history = pd.DataFrame()
-    if os.path.exists(nav_history_csv):
-        nav_history = pd.read_csv(nav_history_csv)
-        nav_history['date'] = pd.to_datetime(nav_history['date'])
+def load_props_map(props_csv):
+    """The ISIN-keyed fund props index (Type/Sector/Cap per ISIN), shared with the settings endpoints."""
+    return props.get_props(props_csv).index()
 
-    props_map = {}
-    if os.path.exists(props_csv):
-        try:
-            p_df = pd.read_csv(props_csv)
-            # Store full info in props_map
-            for _, p_row in p_df.iterrows():
-                props_map[p_row['ISIN']] = {
-                    'Type': p_row['Type'],
-                    'Sector': p_row.get('Sector', 'Others'),
-                    'Cap': p_row.get('Cap', 'Others')
-                }
-        except Exception as e:
-            print(f"Error loading props: {e}")
+def categorize_fund(props_map, isin, name):
+    if isin in props_map: return props_map[isin]['Type']
+    n = str(name).lower()
+    # Default logic for auto-categorization
+    cat = 'Equity'
+    if any(x in n for x in ['liquid', 'overnight', 'money manager']): cat = 'Debt'
+    elif 'gold' in n: cat = 'Commodity'
+    elif any(x in n for x in ['arbitrage', 'balance', 'hybrid', 'dynamic']): cat = 'Hybrid'
+    return cat
 
-    def categorize(isin, name):
-        if isin in props_map: return props_map[isin]['Type']
-        n = str(name).lower()
-        # Default logic for auto-categorization
-        cat = 'Equity'
-        if any(x in n for x in ['liquid', 'overnight', 'money manager']): cat = 'Debt'
-        elif 'gold' in n: cat = 'Commodity'
-        elif any(x in n for x in ['arbitrage', 'balance', 'hybrid', 'dynamic']): cat = 'Hybrid'
-        return cat
-
-    def get_mf_prop(isin, prop_name):
-        if isin in props_map: return props_map[isin].get(prop_name, 'Others')
-        return 'Others'
-
-    # Identify missing ISINs
-    all_isins = cams_df[['ISIN', 'Name']].drop_duplicates()
+def get_mf_prop(props_map, isin, prop_name):
+    if isin in props_map: return props_map[isin].get(prop_name) or 'Others'
+    return 'Others'
+
+CUBE_DIMENSIONS = ['Category', 'ActivityState', 'AMC', 'Sector', 'Cap']
+
+def build_investment_cube(df, months):
+    """
+    Monthly net investment as a columnar cube.
+
+    Rows are the distinct (ISIN, Fund Name, dimension values) combinations and columns the
+    months in `months`; each dimension is stored once as sorted labels plus one integer
+    code per row. Totals per month, per year and per dimension value are precomputed, so
+    the dashboard slices by summing rows picked through the codes instead of regrouping records.
+    """
+    keys = ['ISIN', 'Fund Name'] + CUBE_DIMENSIONS
+    m_idx = pd.Categorical(df['DateKey'], categories=months).codes
+    rows = df[keys].drop_duplicates().sort_values(['Fund Name', 'ISIN']).reset_index(drop=True)
+    row_idx = df[keys].merge(rows.reset_index(), on=keys, how='left')['index'].values
+
+    values = np.zeros((len(rows), len(months)))
+    np.add.at(values, (row_idx, m_idx), df['Amount'].values.astype(float))
+
+    years = sorted({int(m[:4]) for m in months})
+    month_year = np.searchsorted(years, [int(m[:4]) for m in months])
+    by_year = np.zeros((len(rows), len(years)))
+    np.add.at(by_year, (slice(None), month_year), values)
+
+    dims, rollups = {}, {}
+    for dim in CUBE_DIMENSIONS:
+        dims[dim], rollups[dim] = _cube_dimension(rows[dim].astype(str).tolist(), values)
+
+    return {
+        "months": months,
+        "years": years,
+        "month_year": month_year.tolist(),
+        "rows": {'ISIN': rows['ISIN'].tolist(), 'Fund Name': rows['Fund Name'].tolist()},
+        "dims": dims,
+        "values": np.round(values, 2).tolist(),
+        "by_year": np.round(by_year, 2).tolist(),
+        "rollups": rollups,
+        "totals": np.round(values.sum(axis=0), 2).tolist(),
+        "row_totals": np.round(values.sum(axis=1), 2).tolist(),
+    }
+
+def _cube_dimension(row_labels, values):
+    """One cube dimension: ({labels, codes}, rollup of `values` per label) for per-row labels."""
+    labels, codes = np.unique(np.array(row_labels, dtype=str), return_inverse=True)
+    roll = np.zeros((len(labels), np.shape(values)[1]))
+    np.add.at(roll, codes, np.asarray(values, dtype=float))
+    return {'labels': labels.tolist(), 'codes': codes.tolist()}, np.round(roll, 2).tolist()
+
+def discover_props(props_map, funds_df, props_csv):
+    """Adds default props for ISINs in `funds_df` (ISIN, Name) missing from `props_map` and persists them."""
+    all_isins = funds_df[['ISIN', 'Name']].drop_duplicates(subset=['ISIN'])
     new_props = []
-    updated = False
-    for _, row in all_isins.iterrows():
-        isin = row['ISIN']
+    for isin, name in zip(all_isins['ISIN'], all_isins['Name']):
         if isin not in props_map:
-            cat = categorize(isin, row['Name'])
             # Initial defaults for new funds
-            props_map[isin] = {'Type': cat, 'Sector': 'Others', 'Cap': 'Others'}
-            new_props.append({'Name': row['Name'], 'ISIN': isin, 'Type': cat, 'Sector': 'Others', 'Cap': 'Others'})
-            updated = True
-    
-    if updated and os.path.exists(props_csv):
+            new_props.append({'Name': name, 'ISIN': isin, 'Type': categorize_fund(props_map, isin, name), 'Sector': 'Others', 'Cap': 'Others'})
+
+    if new_props and os.path.exists(props_csv):
         try:
-            old_props = pd.read_csv(props_csv)
-            new_df = pd.DataFrame(new_props)
-            combined_props = pd.concat([old_props, new_df], ignore_index=True).drop_duplicates(subset=['ISIN'])
-            combined_props.to_csv(props_csv, index=False)
+            props.get_props(props_csv).upsert(new_props)
             print(f"Auto-discovered {len(new_props)} new funds and updated {props_csv}")
         except Exception as e:
             print(f"Failed to auto-update mf-props: {e}")
+    return new_props
+
+def category_allocation(scheme_details):
+    """{Category: current value held}, largest first; shared by the full build and apply_props so both agree."""
+    held = defaultdict(float)
+    for s in scheme_details:
+        if s['units_left'] > 0:
+            held[s['Category']] += s['current_val']
+    return {c: round(v, 2) for c, v in sorted(held.items(), key=lambda kv: -kv[1])}
+
+def apply_props(data, props_map):
+    """
+    Re-derives the props-dependent parts of a built dashboard in place: each fund's
+    Category (from its Type), Sector and Cap wherever they appear, the category
+    allocation and the cube's Category/Sector/Cap dimensions. Used when only
+    mf-props changed, instead of rebuilding the whole dashboard.
+    """
+    category, sector, cap = {}, {}, {}
+    for s in data['scheme_details']:
+        isin = s['ISIN']
+        s['Category'] = category[isin] = categorize_fund(props_map, isin, s['Fund Name'])
+        s['Sector'] = sector[isin] = get_mf_prop(props_map, isin, 'Sector')
+        s['Cap'] = cap[isin] = get_mf_prop(props_map, isin, 'Cap')
+    data['categories'] = sorted(set(category.values()))
+    data['sectors'] = sorted(set(sector.values()))
+    data['caps'] = sorted(set(cap.values()))
+
+    data['allocations']['category'] = category_allocation(data['scheme_details'])
+
+    for cf in data['cash_flows']:
+        cf['category'] = categorize_fund(props_map, cf['isin'], cf['fund'])
+    for day in data['growth_chart']:
+        for isin, b in day['b'].items():
+            b['c'] = category.get(isin, 'Unknown')
+    for p in data['performance_comparison']:
+        p['category'] = category[p['isin']]
+    for t in data['transition_planning']:
+        t['Category'] = categorize_fund(props_map, t['ISIN'], t['scheme'])
+        t['Sector'], t['Cap'] = sector.get(t['ISIN'], 'Others'), cap.get(t['ISIN'], 'Others')
+
+    cube = data['investment_summary']
+    row_isins, row_names = cube['rows']['ISIN'], cube['rows']['Fund Name']
+    labels = {
+        'Category': [categorize_fund(props_map, i, n) for i, n in zip(row_isins, row_names)],
+        'Sector': [sector.get(i, 'Others') for i in row_isins],
+        'Cap': [cap.get(i, 'Others') for i in row_isins],
+    }
+    for dim, row_labels in labels.items():
+        if row_isins:
+            cube['dims'][dim], cube['rollups'][dim] = _cube_dimension(row_labels, cube['values'])
+    return data
+
+def load_inputs(gains_csv, realized_csv, nav_history_csv, cams_csv='data/cams_mf.csv', portfolio=store.DEFAULT_PORTFOLIO):
+    """(lots, transactions, realized gains, NAV history) of a portfolio, or None if it has no lots."""
+    # Typed tables from the store; the CSV paths are only used to migrate legacy files
+    conn = store.connect()
+    try:
+        unified_df = store.load_table('lots', portfolio, csv_fallback=gains_csv, conn=conn) # mf_gains_v2
+        if unified_df.empty:
+            return None
+        cams_df = store.load_table('transactions', portfolio, csv_fallback=cams_csv, conn=conn)
+        realized_df = store.load_table('realized_gains', portfolio, csv_fallback=realized_csv, conn=conn)
+    finally:
+        conn.close()
+    
+    nav_history = pd.DataFrame()
+    if os.path.exists(nav_history_csv):
+        nav_history = schema.read_nav_csv(nav_history_csv)
+    return unified_df, cams_df, realized_df, nav_history
+
+def calculate_analytics(gains_csv, realized_csv, nav_history_csv, props_csv, cams_csv='data/cams_mf.csv', pdf_dir='cas_pdf',
+                        portfolio=store.DEFAULT_PORTFOLIO):
+    inputs = load_inputs(gains_csv, realized_csv, nav_history_csv, cams_csv, portfolio=portfolio)
+    if inputs is None:
+        return None
+    return build_dashboard(*inputs, props_csv, pdf_dir=pdf_dir, portfolio=portfolio)
+
+def build_dashboard(unified_df, cams_df, realized_df, nav_history, props_csv, pdf_dir='cas_pdf', portfolio=store.DEFAULT_PORTFOLIO):
+    """Computes the dashboard payload from in-memory lots, transactions, realized gains and NAV history."""
+    data = {name: list(value) if isinstance(value, types.GeneratorType) else value
+            for name, value in iter_dashboard(unified_df, cams_df, realized_df, nav_history, props_csv,
+                                               pdf_dir=pdf_dir, portfolio=portfolio)}
+    return data or None
+
+def iter_dashboard(unified_df, cams_df, realized_df, nav_history, props_csv, pdf_dir='cas_pdf', portfolio=store.DEFAULT_PORTFOLIO):
+    """
+    Yields the dashboard payload as (section, value) pairs, each as soon as it is final.
+
+    The long per-row sections (growth_chart, cash_flows) are generators, so a streaming
+    writer can serialize them row by row without holding them as lists; nothing is
+    yielded if there are no lots.
+    """
+    if unified_df is None or unified_df.empty:
+        return
+    # Columns are added below; a shallow copy keeps the caller's frame untouched
+    unified_df = unified_df.copy(deep=False)
+
+    if not nav_history.empty:
+        # The NAV store is shared between portfolios; keep only the schemes held here
+        nav_history = nav_history[nav_history['isin'].isin(cams_df['ISIN'].unique())]
+
+    props_map = load_props_map(props_csv)
+
+    def categorize(isin, name):
+        return categorize_fund(props_map, isin, name)
+
+    # Identify missing ISINs (persisted ones show up in the props index)
+    if discover_props(props_map, cams_df[['ISIN', 'Name']], props_csv):
+        props_map = load_props_map(props_csv)
 
     unified_df['Category'] = unified_df.apply(lambda x: categorize(x['ISIN'], x['Fund Name']), axis=1)
 
     # --- ACTIVITY STATE ---
     now = datetime.now()
     inv_events_all = cams_df[~cams_df['Investment Type'].str.contains('Redemption|Switch Out|Withdrawal', case=False, na=False)]
-    last_inv = inv_events_all.groupby('ISIN')['Date'].max()
+    last_inv = inv_events_all.groupby('ISIN', observed=True)['Date'].max()
     
     def get_activity_state(isin):
         if isin not in last_inv: return 'Closed'
@@ -102,46 +223,34 @@ def calculate_analytics(gains_csv, realized_csv, nav_history_csv, props_csv):
         return 'Closed'
 
     # --- SCHEME LIST ---
-    scheme_agg = unified_df.groupby(['ISIN', 'Fund Name', 'Category', 'AMC']).agg({
+    scheme_agg = unified_df.groupby(['ISIN', 'Fund Name', 'Category', 'AMC'], observed=True).agg({
         'invested_val': 'sum', 'current_val': 'sum', 'unrealized_gain': 'sum', 'Units': 'sum', 'units_left': 'sum'
     }).reset_index()
 
-    stcg_unreal = unified_df[unified_df['gain_type'] == 'STCG'].groupby('ISIN')['unrealized_gain'].sum().to_dict()
-    ltcg_unreal = unified_df[unified_df['gain_type'] == 'LTCG'].groupby('ISIN')['unrealized_gain'].sum().to_dict()
-    ltcg_units = unified_df[unified_df['gain_type'] == 'LTCG'].groupby('ISIN')['units_left'].sum().to_dict()
-    today = datetime.now()
-    if today.month < 4:
-        curr_fy_start = datetime(today.year - 1, 4, 1)
-        last_fy_start = datetime(today.year - 2, 4, 1)
-        last_fy_end = datetime(today.year - 1, 3, 31)
-    else:
-        curr_fy_start = datetime(today.year, 4, 1)
-        last_fy_start = datetime(today.year - 1, 4, 1)
-        last_fy_end = datetime(today.year, 3, 31)
+    stcg_unreal = unified_df[unified_df['gain_type'] == 'STCG'].groupby('ISIN', observed=True)['unrealized_gain'].sum().to_dict()
+    ltcg_unreal = unified_df[unified_df['gain_type'] == 'LTCG'].groupby('ISIN', observed=True)['unrealized_gain'].sum().to_dict()
+    ltcg_units = unified_df[unified_df['gain_type'] == 'LTCG'].groupby('ISIN', observed=True)['units_left'].sum().to_dict()
+    net_inv_map = cams_df.groupby('ISIN', observed=True)['Amount'].sum().to_dict()
+
+    # Realized gains come pre-bucketed per financial year from the persistent tax-lot ledger,
+    # which applies only the transactions added since its last sync
+    ledger = taxlots.get_ledger(portfolio, cams_df)
+    curr_fy = taxlots.fy_of(now.date())
+    fy_gains = ledger.fy_buckets()
+    by_type = fy_gains.groupby(['isin', 'type'])['gain'].sum()
+    real_st = by_type.xs('STCG', level='type').to_dict() if 'STCG' in fy_gains['type'].values else {}
+    real_lt = by_type.xs('LTCG', level='type').to_dict() if 'LTCG' in fy_gains['type'].values else {}
 
-    net_inv_map = cams_df.groupby('ISIN')['Amount'].sum().to_dict()
-    real_st = realized_df[realized_df['Type'] == 'STCG'].groupby('ISIN')['Gain'].sum().to_dict() if not realized_df.empty else {}
-    real_lt = realized_df[realized_df['Type'] == 'LTCG'].groupby('ISIN')['Gain'].sum().to_dict() if not realized_df.empty else {}
-    
     realized_summary = {}
-    if not realized_df.empty:
-        # Group by ISIN and calculate everything
-        for isin, group in realized_df.groupby('ISIN'):
-            res = {'realized_gain': group['Gain'].sum(), 'stcg': 0, 'ltcg': 0,
-                   'stcg_curr': 0, 'ltcg_curr': 0, 'stcg_last': 0, 'ltcg_last': 0}
-            
-            res['stcg'] = group[group['Type'] == 'STCG']['Gain'].sum()
-            res['ltcg'] = group[group['Type'] == 'LTCG']['Gain'].sum()
-            
-            curr_fy = group[group['Sell Date'] >= curr_fy_start]
-            res['stcg_curr'] = curr_fy[curr_fy['Type'] == 'STCG']['Gain'].sum()
-            res['ltcg_curr'] = curr_fy[curr_fy['Type'] == 'LTCG']['Gain'].sum()
-            
-            last_fy = group[(group['Sell Date'] >= last_fy_start) & (group['Sell Date'] <= last_fy_end)]
-            res['stcg_last'] = last_fy[last_fy['Type'] == 'STCG']['Gain'].sum()
-            res['ltcg_last'] = last_fy[last_fy['Type'] == 'LTCG']['Gain'].sum()
-            
-            realized_summary[isin] = {k: round(v, 2) for k, v in res.items()}
+    for (isin, fy, t), gain in fy_gains.groupby(['isin', 'fy', 'type'])['gain'].sum().items():
+        res = realized_summary.setdefault(isin, dict.fromkeys(['realized_gain', 'stcg', 'ltcg', 'stcg_curr', 'ltcg_curr',
+                                                                  'stcg_last', 'ltcg_last'], 0.0))
+        t = t.lower()
+        res['realized_gain'] += gain
+        res[t] += gain
+        if fy >= curr_fy: res[f'{t}_curr'] += gain
+        elif fy == curr_fy - 1: res[f'{t}_last'] += gain
+    realized_summary = {isin: {k: round(v, 2) for k, v in res.items()} for isin, res in realized_summary.items()}
 
     scheme_list = []
     for _, r in scheme_agg.iterrows():
@@ -170,25 +279,27 @@ def calculate_analytics(gains_csv, realized_csv, nav_history_csv, props_csv):
         detail['abs_return'] = round((total_profit / ni * 100) if ni > 0 else 0, 4)
         
         detail['ActivityState'] = get_activity_state(isin)
-        detail['Sector'] = get_mf_prop(isin, 'Sector')
-        detail['Cap'] = get_mf_prop(isin, 'Cap')
+        detail['Sector'] = get_mf_prop(props_map, isin, 'Sector')
+        detail['Cap'] = get_mf_prop(props_map, isin, 'Cap')
         
         scheme_list.append(detail)
 
+    yield 'scheme_details', scheme_list
+    yield 'categories', sorted(unified_df['Category'].unique().tolist())
+    yield 'amcs', sorted(unified_df['AMC'].unique().tolist())
+    yield 'sectors', sorted(list(set(s['Sector'] for s in scheme_list)))
+    yield 'caps', sorted(list(set(s['Cap'] for s in scheme_list)))
+    yield 'activity_states', ["Active", "Recent", "Closed"]
+
     # --- CASH FLOWS (XIRR) ---
-    cash_flows = []
-    for _, row in cams_df.iterrows():
-        if row['Amount'] != 0:
-            cash_flows.append({
-                'date': row['Date'].strftime('%Y-%m-%d'), 'amount': -float(row['Amount']),
-                'category': categorize(row['ISIN'], row['Name']), 'isin': row['ISIN'], 'fund': row['Name']
-            })
-    for _, row in scheme_agg.iterrows():
-        if row['current_val'] > 0:
-            cash_flows.append({
-                'date': now.strftime('%Y-%m-%d'), 'amount': float(row['current_val']),
-                'category': row['Category'], 'isin': row['ISIN'], 'fund': row['Fund Name']
-            })
+    def cash_flows():
+        for d, amount, isin, name in zip(cams_df['Date'], cams_df['Amount'], cams_df['ISIN'], cams_df['Name']):
+            if amount != 0:
+                yield {'date': d.strftime('%Y-%m-%d'), 'amount': -float(amount), 'category': categorize(isin, name), 'isin': isin, 'fund': name}
+        for cur, cat, isin, name in zip(scheme_agg['current_val'], scheme_agg['Category'], scheme_agg['ISIN'], scheme_agg['Fund Name']):
+            if cur > 0:
+                yield {'date': now.strftime('%Y-%m-%d'), 'amount': float(cur), 'category': cat, 'isin': isin, 'fund': name}
+    yield 'cash_flows', cash_flows()
 
     # --- INVESTMENT SUMMARY ---
     # Unified filter mapping
@@ -197,22 +308,17 @@ def calculate_analytics(gains_csv, realized_csv, nav_history_csv, props_csv):
     unified_df['Sector'] = unified_df['ISIN'].map(lambda x: isin_meta.get(x, {}).get('Sector', 'Others'))
     unified_df['Cap'] = unified_df['ISIN'].map(lambda x: isin_meta.get(x, {}).get('Cap', 'Others'))
     
-    unified_df['MonthName'] = unified_df['Date'].dt.strftime('%b')
-    unified_df['Year'] = unified_df['Date'].dt.year
     unified_df['DateKey'] = unified_df['Date'].dt.strftime('%Y-%m')
-    inv_pivot = unified_df.groupby(['ISIN', 'Fund Name', 'Category', 'ActivityState', 'AMC', 'Sector', 'Cap', 'Year', 'MonthName', 'DateKey'])['Amount'].sum().reset_index()
-    inv_pivot.rename(columns={'MonthName': 'Month'}, inplace=True)
-    
     m_keys = sorted(unified_df['DateKey'].unique().tolist())
-    monthly_investment_data = { "pivot": inv_pivot.to_dict('records'), "totals": [], "months": m_keys }
+    yield 'investment_summary', build_investment_cube(unified_df, m_keys)
 
     # --- ROLLING RETURNS & PERFORMANCE COMPARISON ---
     rolling_stats = {}
     perf_comparison = []
-    
-    if not nav_history.empty:
-        n_piv = nav_history.pivot_table(index='date', columns='isin', values='nav').sort_index().ffill()
-        
+    # One date x ISIN NAV matrix, shared with the growth chart below
+    n_piv = nav_history.pivot_table(index='date', columns='isin', values='nav', observed=True).sort_index().ffill() if not nav_history.empty else None
+
+    if n_piv is not None:
         for scheme in scheme_list:
             isin = scheme['ISIN']
             if isin not in n_piv.columns: continue
@@ -265,63 +371,65 @@ def calculate_analytics(gains_csv, realized_csv, nav_history_csv, props_csv):
                         'latest': round(roll_vals[0], 2)
                     }
             if stats: rolling_stats[isin] = stats
+    yield 'rolling_stats', rolling_stats
+    yield 'performance_comparison', perf_comparison
 
     # --- GROWTH CHART ---
-    growth_chart = []
     if not nav_history.empty:
-        p_ev = cams_df[~cams_df['Investment Type'].str.contains('Redemption|Switch Out', case=False, na=False)].copy()
-        p_ev['Cost'] = p_ev['Units'] * p_ev['Price']
-        s_ev = pd.DataFrame()
+        p_ev = cams_df[~cams_df['Investment Type'].str.contains('Redemption|Switch Out', case=False, na=False)]
+        events = [pd.DataFrame({'Date': p_ev['Date'], 'ISIN': p_ev['ISIN'].astype(str), 'Units': p_ev['Units'], 'Cost': p_ev['Units'] * p_ev['Price']})]
         if not realized_df.empty:
-            s_ev = pd.DataFrame({'Date': realized_df['Sell Date'], 'ISIN': realized_df['ISIN'], 'Units': -realized_df['Units'], 'Cost': -(realized_df['Units'] * realized_df['Buy Price'])})
-        all_ev = pd.concat([p_ev[['Date', 'ISIN', 'Units', 'Cost']], s_ev]).sort_values('Date')
+            events.append(pd.DataFrame({'Date': realized_df['Sell Date'], 'ISIN': realized_df['ISIN'].astype(str), 'Units': -realized_df['Units'], 'Cost': -(realized_df['Units'] * realized_df['Buy Price'])}))
+        all_ev = pd.concat(events).sort_values('Date')
         u_piv = all_ev.pivot_table(index='Date', columns='ISIN', values='Units', aggfunc='sum').fillna(0).cumsum()
+        c_piv = all_ev.pivot_table(index='Date', columns='ISIN', values='Cost', aggfunc='sum').fillna(0).cumsum()
         i_cum = all_ev.groupby('Date')['Cost'].sum().cumsum()
-        n_piv = nav_history.pivot_table(index='date', columns='isin', values='nav').sort_index().ffill()
         f_idx = pd.date_range(all_ev['Date'].min(), now, freq='D')
         if f_idx[-1] < now:
             f_idx = f_idx.union([pd.Timestamp(now)])
         # Prepare ISIN to Category mapping for easier sum in JS
         isin_to_cat = {s['ISIN']: s['Category'] for s in scheme_list}
         
-        for d in f_idx:
-            # Net cost and cumulative units up to date d
-            inv_row = i_cum[i_cum.index <= d]
-            inv_val = inv_row.iloc[-1] if not inv_row.empty else 0
-            
-            u_d = u_piv[u_piv.index <= d].iloc[-1] if not u_piv[u_piv.index <= d].empty else pd.Series()
-            n_d = n_piv[n_piv.index <= d].iloc[-1] if not n_piv[n_piv.index <= d].empty else pd.Series()
-            
-            if not u_d.empty and not n_d.empty:
-                com = u_d.index.intersection(n_d.index)
-                # We need per-isin values for dynamic frontend filtering
-                breakdown = {}
-                # Also get per-isin cost up to date d
-                c_d = all_ev[all_ev['Date'] <= d].groupby('ISIN')['Cost'].sum()
+        # Row positions of the last event / NAV on or before each day (views, no per-day copies)
+        ev_pos = u_piv.index.searchsorted(f_idx, side='right') - 1
+        nav_pos = n_piv.index.searchsorted(f_idx, side='right') - 1
+
+        def growth_chart():
+            for d, e_i, n_i in zip(f_idx, ev_pos, nav_pos):
+                if e_i >= 0 and n_i >= 0:
+                    u_d, n_d = u_piv.iloc[e_i], n_piv.iloc[n_i]
+                    com = u_d.index.intersection(n_d.index)
+                    # We need per-isin values for dynamic frontend filtering
+                    breakdown = {}
+                    # Also get per-isin cost up to date d
+                    c_d = c_piv.iloc[e_i]
                 
-                for isin in com:
-                    units = u_d[isin]
-                    nav = n_d[isin]
-                    cost = c_d.get(isin, 0)
+                    for isin in com:
+                        units = u_d[isin]
+                        nav = n_d[isin]
+                        cost = c_d.get(isin, 0)
                     
-                    # Handle NaN values to prevent invalid JSON
-                    safe_nav = float(nav) if pd.notnull(nav) else 0.0
-                    safe_cost = float(cost) if pd.notnull(cost) else 0.0
-                    safe_units = float(units) if pd.notnull(units) else 0.0
+                        # Handle NaN values to prevent invalid JSON
+                        safe_nav = float(nav) if pd.notnull(nav) else 0.0
+                        safe_cost = float(cost) if pd.notnull(cost) else 0.0
+                        safe_units = float(units) if pd.notnull(units) else 0.0
                     
-                    val = safe_units * safe_nav
+                        val = safe_units * safe_nav
                     
-                    if safe_units > 0 or abs(safe_cost) > 0:
-                        breakdown[isin] = {
-                            'v': round(val, 2),
-                            'i': round(safe_cost, 2),
-                            'c': isin_to_cat.get(isin, 'Unknown')
+                        if safe_units > 0 or abs(safe_cost) > 0:
+                            breakdown[isin] = {
+                                'v': round(val, 2),
+                                'i': round(safe_cost, 2),
+                                'c': isin_to_cat.get(isin, 'Unknown')
+                            }
+                    if breakdown:
+                        yield {
+                            'date': d.strftime('%Y-%m-%d'),
+                            'b': breakdown # 'b' for breakdown to save space
                         }
-                if breakdown:
-                    growth_chart.append({
-                        'date': d.strftime('%Y-%m-%d'),
-                        'b': breakdown # 'b' for breakdown to save space
-                    })
+        yield 'growth_chart', growth_chart()
+    else:
+        yield 'growth_chart', []
 
     # Final Summary Stats
     cur_val = scheme_agg['current_val'].sum()
@@ -331,17 +439,8 @@ def calculate_analytics(gains_csv, realized_csv, nav_history_csv, props_csv):
 
     dashboard_data = {
         "summary": { "current_value": round(cur_val, 2), "total_invested": round(inv_val, 2), "realized_gain": round(total_real, 2), "unrealized_gain": round(total_unreal, 2), "total_profit": round(total_unreal + total_real, 2) },
-        "investment_summary": monthly_investment_data,
-        "allocations": { "amc": unified_df[unified_df['units_left'] > 0].groupby('AMC')['current_val'].sum().sort_values(ascending=False).to_dict(), "category": unified_df[unified_df['units_left'] > 0].groupby('Category')['current_val'].sum().sort_values(ascending=False).to_dict() },
-        "growth_chart": growth_chart, "scheme_details": scheme_list, 
-        "categories": sorted(unified_df['Category'].unique().tolist()), 
-        "amcs": sorted(unified_df['AMC'].unique().tolist()),
-        "sectors": sorted(list(set(s['Sector'] for s in scheme_list))),
-        "caps": sorted(list(set(s['Cap'] for s in scheme_list))),
-        "activity_states": ["Active", "Recent", "Closed"],
-        "cash_flows": cash_flows, "transition_planning": [],
-        "rolling_stats": rolling_stats,
-        "performance_comparison": perf_comparison,
+        "allocations": { "amc": unified_df[unified_df['units_left'] > 0].groupby('AMC', observed=True)['current_val'].sum().sort_values(ascending=False).to_dict(), "category": category_allocation(scheme_list) },
+        "transition_planning": [],
         "gains_breakdown": { 
             "unrealized": { "stcg": round(unified_df[unified_df['gain_type'] == 'STCG']['unrealized_gain'].sum(), 2), "ltcg": round(unified_df[unified_df['gain_type'] == 'LTCG']['unrealized_gain'].sum(), 2) },
             "realized": { "stcg": round(sum(real_st.values()) if real_st else 0, 2), "ltcg": round(sum(real_lt.values()) if real_lt else 0, 2) }
@@ -356,62 +455,49 @@ def calculate_analytics(gains_csv, realized_csv, nav_history_csv, props_csv):
     
     # Calculate last file date in cas_pdf
     try:
-        pdf_files = [os.path.join('cas_pdf', f) for f in os.listdir('cas_pdf') if f.lower().endswith('.pdf')]
+        pdf_files = [os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.lower().endswith('.pdf')]
         if pdf_files:
             latest_file = max(pdf_files, key=os.path.getmtime)
             dashboard_data["data_stats"]["last_file_date"] = datetime.fromtimestamp(os.path.getmtime(latest_file)).strftime('%Y-%m-%d %H:%M:%S')
     except: pass
     
     # Rest of transitions and realized breakdown
-    real_st_sum = realized_df[realized_df['Type'] == 'STCG']['Gain'].sum() if not realized_df.empty else 0
-    real_lt_sum = realized_df[realized_df['Type'] == 'LTCG']['Gain'].sum() if not realized_df.empty else 0
-    
-    dashboard_data["gains_breakdown"]["realized"] = {"stcg": round(real_st_sum, 2), "ltcg": round(real_lt_sum, 2)}
+    fy_totals = fy_gains.groupby(['fy', 'type'])['gain'].sum()
+    def fy_total(t, keep=lambda fy: True):
+        return round(sum((g for (fy, typ), g in fy_totals.items() if typ == t and keep(fy)), 0.0), 2)
+
+    dashboard_data["gains_breakdown"]["realized"] = {"stcg": fy_total('STCG'), "ltcg": fy_total('LTCG')}
 
     # FY Breakdown for Realized Gains
-    realized_fy = {
-        "ALL": {"stcg": round(real_st_sum, 2), "ltcg": round(real_lt_sum, 2)},
-        "CURRENT": {"stcg": 0, "ltcg": 0},
-        "LAST": {"stcg": 0, "ltcg": 0}
+    current, last = (lambda fy: fy >= curr_fy), (lambda fy: fy == curr_fy - 1)
+    dashboard_data["gains_breakdown"]["realized_fy"] = {
+        "ALL": {"stcg": fy_total('STCG'), "ltcg": fy_total('LTCG')},
+        "CURRENT": {"stcg": fy_total('STCG', current), "ltcg": fy_total('LTCG', current)},
+        "LAST": {"stcg": fy_total('STCG', last), "ltcg": fy_total('LTCG', last)}
     }
 
-    if not realized_df.empty:
-        c_fy = realized_df[realized_df['Sell Date'] >= curr_fy_start]
-        realized_fy["CURRENT"]["stcg"] = round(c_fy[c_fy['Type'] == 'STCG']['Gain'].sum(), 2)
-        realized_fy["CURRENT"]["ltcg"] = round(c_fy[c_fy['Type'] == 'LTCG']['Gain'].sum(), 2)
-        
-        l_fy = realized_df[(realized_df['Sell Date'] >= last_fy_start) & (realized_df['Sell Date'] <= last_fy_end)]
-        realized_fy["LAST"]["stcg"] = round(l_fy[l_fy['Type'] == 'STCG']['Gain'].sum(), 2)
-        realized_fy["LAST"]["ltcg"] = round(l_fy[l_fy['Type'] == 'LTCG']['Gain'].sum(), 2)
-
-    dashboard_data["gains_breakdown"]["realized_fy"] = realized_fy
-
-    # Transition Planning
-    st_lots = unified_df[unified_df['gain_type'] == 'STCG'].copy()
-    for _, l in st_lots.iterrows():
-        dl = 365 - (now - l['Date']).days
-        if 0 < dl <= 90:
-            isin = l['ISIN']
-            meta = isin_meta.get(isin, {})
-            dashboard_data["transition_planning"].append({
-                'ISIN': isin,
-                'scheme': l['Fund Name'],
-                'units': round(l['units_left'], 4),
-                'gain': round(l['unrealized_gain'], 2),
-                'days_left': dl,
-                'date': l['Date'].strftime('%Y-%m-%d'),
-                'Category': l['Category'],
-                'AMC': l['AMC'],
-                'Sector': meta.get('Sector', 'Others'),
-                'Cap': meta.get('Cap', 'Others'),
-                'ActivityState': meta.get('ActivityState', 'Others')
-            })
-    dashboard_data["transition_planning"].sort(key=lambda x: x['days_left'])
-
-    return dashboard_data
+    # Transition Planning: open lots whose LTCG date falls in the next 90 days (index range read)
+    nav_last = unified_df.groupby('ISIN', observed=True)['nav_last'].first().to_dict()
+    for l in ledger.turning_long_term(90, now.date()).itertuples(index=False):
+        meta = isin_meta.get(l.isin, {})
+        dashboard_data["transition_planning"].append({
+            'ISIN': l.isin,
+            'scheme': l.fund_name,
+            'units': round(l.units_left, 4),
+            'gain': round(l.units_left * (nav_last.get(l.isin, np.nan) - l.price), 2),
+            'days_left': l.days_left,
+            'date': l.buy_date,
+            'Category': categorize(l.isin, l.fund_name),
+            'AMC': l.amc,
+            'Sector': meta.get('Sector', 'Others'),
+            'Cap': meta.get('Cap', 'Others'),
+            'ActivityState': meta.get('ActivityState', 'Others')
+        })
+
+    yield from dashboard_data.items()
 
 if __name__ == "__main__":
     data = calculate_analytics('data/mf_gains_v2.csv', 'data/realized_gains.csv', 'data/full_nav_history.csv', 'data/mf-props.csv')
     if data:
-        with open('data/dashboard_data.json', 'w') as f: json.dump(data, f, indent=4)
+        with open('data/dashboard_data.json', 'w') as f: json.dump(data, f, separators=(',', ':'))
         print("Analytics processed successfully.")
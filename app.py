@@ -1,20 +1,19 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
 import json
 import os
-import pandas as pd
 import threading
 from datetime import datetime
 from werkzeug.utils import secure_filename
 
 # Import our custom modules
-import processor
-import analytics
-import cams
+# Heavy subsystems (pipeline -> pandas, numpy, pdfplumber, requests, pyxirr) are imported
+# lazily by the routes that need them, so workers serving only cached data start fast.
+import portfolios
+import scheduler
 
 app = Flask(__name__)
 
 # CONFIGURATION
-DATA_FILE = 'data/dashboard_data.json'
 UPLOAD_FOLDER = 'cas_pdf'
 EXTERNAL_URL = "https://www.camsonline.com/Investors/Statements/Consolidated-Account-Statement" # Configurable URL
 PDF_PASSWORD = "qwerty@12345" # Configurable password
@@ -26,26 +25,39 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def run_pipeline(force_nav=False, new_pdf=None, password=None):
-    """Orchestrates the data processing pipeline."""
+def get_portfolio():
+    """Portfolio namespace of the current request (`?portfolio=` or form field)."""
+    return request.values.get('portfolio') or portfolios.DEFAULT_PORTFOLIO
+
+def unknown_portfolio(portfolio):
+    """404 response if `portfolio` has no transactions (reads must not create its namespace or ledger), else None."""
+    if portfolio not in portfolios.list_portfolios():
+        return jsonify({"error": f"No transactions for portfolio '{portfolio}'; upload a statement first"}), 404
+    return None
+
+def run_pipeline(force_nav=False, new_pdf=None, password=None, portfolio=portfolios.DEFAULT_PORTFOLIO):
+    """Orchestrates the data processing pipeline (extraction -> NAV -> FIFO -> analytics, in-process)."""
+    # Serialized with the background scheduler's runs of the same portfolio
+    return scheduler.get_scheduler().run_portfolio(portfolio, force_nav=force_nav, new_pdf=new_pdf, password=password)
+
+# Served dashboards: path -> ((mtime_ns, size), raw JSON bytes). Dashboards are replaced by
+# atomic rename, so a changed stamp means a complete new file to swap in.
+_served = {}
+
+def load_dashboard(data_file):
+    """Raw dashboard JSON, re-read from disk only after the file was replaced; None if it does not exist."""
     try:
-        # 1. Extraction (only if new PDF provided)
-        if new_pdf:
-            if not password: return False, "Password required for PDF"
-            success, msg = cams.process_cams_pdf(new_pdf, password)
-            if not success: return False, f"CAS Error: {msg}"
-
-        # 2. Processing (NAV and FIFO)
-        processor.process_mf_data('data/cams_mf.csv', 'data/mf_gains_v2.csv', 'data/realized_gains.csv', force_refresh=force_nav)
-
-        # 3. Analytics
-        data = analytics.calculate_analytics('data/mf_gains_v2.csv', 'data/realized_gains.csv', 'data/full_nav_history.csv', 'data/mf-props.csv')
-        if data:
-            with open(DATA_FILE, 'w') as f: json.dump(data, f, indent=4)
-        
-        return True, "Pipeline completed successfully"
-    except Exception as e:
-        return False, str(e)
+        st = os.stat(data_file)
+    except FileNotFoundError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _served.get(data_file)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with open(data_file, 'rb') as f:
+        raw = f.read()
+    _served[data_file] = (stamp, raw)
+    return raw
 
 @app.route('/')
 def index():
@@ -53,18 +65,140 @@ def index():
 
 @app.route('/api/data')
 def get_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            data = json.load(f)
-        return jsonify(data)
+    try:
+        portfolio = get_portfolio()
+        data_file = portfolios.get_paths(portfolio)['dashboard_json']
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    raw = load_dashboard(data_file)
+    if raw is not None:
+        return Response(raw, mimetype='application/json')
+    missing = unknown_portfolio(portfolio)
+    if missing: return missing
+    sched = scheduler.get_scheduler()
+    last = sched.get_status()['portfolios'].get(portfolio)
+    if last and not last['ok']:
+        # Retrying on every poll would fail the same way; a refresh or upload runs it again
+        return jsonify({"error": f"Dashboard could not be built: {last['message']}"}), 500
+    # Never built: compute it in the background instead of holding the request
+    sched.trigger(portfolio)
+    return jsonify({"status": "pending", "message": "Dashboard is being prepared, retry shortly"}), 503
+
+@app.route('/api/status')
+def get_status():
+    """Background refresh status: last scheduled run, per-portfolio last run, next run."""
+    return jsonify(scheduler.get_scheduler().get_status())
+
+@app.route('/api/asof')
+def get_asof():
+    """Point-in-time valuation: ?date=YYYY-MM-DD or ?dates=YYYY-MM-DD,YYYY-MM-DD,..."""
+    import asof
+    raw = request.args.get('dates') or request.args.get('date')
+    if not raw:
+        return jsonify({"error": "date is required (YYYY-MM-DD)"}), 400
+    try:
+        dates = [datetime.strptime(d.strip(), '%Y-%m-%d').date() for d in raw.split(',') if d.strip()]
+    except ValueError:
+        return jsonify({"error": "dates must be YYYY-MM-DD"}), 400
+    if not dates:
+        return jsonify({"error": "date is required (YYYY-MM-DD)"}), 400
+
+    portfolio = get_portfolio()
+    missing = unknown_portfolio(portfolio)
+    if missing: return missing
+    valuer = asof.get_valuer(portfolio)
+    if valuer is None:
+        return jsonify({"error": "No transactions found"}), 404
+    results = valuer.value_many(dates)
+    if 'dates' in request.args:
+        return jsonify(results)
+    return jsonify(results[0])
+
+@app.route('/api/backtest')
+def get_backtest():
+    """
+    SIP / lumpsum / STP backtest from every start month: ?strategy=sip&amount=10000&since=2015
+    [&years=5 rolling horizon][&isins=A,B | &universe=all][&stp_months=12&source=ISIN][&series=1]
+    """
+    import backtest
+    import store
+    try:
+        strategy = request.args.get('strategy', 'sip')
+        amount = float(request.args.get('amount', 10000))
+        years = request.args.get('years')
+        horizon = int(round(float(years) * 12)) if years else None
+        since = request.args.get('since')
+        if since and len(since) == 4: since = f"{since}-01-01"
+        if since: datetime.strptime(since, '%Y-%m-%d')
+        stp_months = int(request.args.get('stp_months', 12))
+        if strategy not in backtest.STRATEGIES or amount <= 0 or stp_months <= 0 or (horizon is not None and horizon <= 0):
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": f"Invalid parameters (strategy one of {', '.join(backtest.STRATEGIES)}, positive amount/years/stp_months, since YYYY or YYYY-MM-DD)"}), 400
+
+    bt = backtest.get_backtester()
+    if bt is None:
+        return jsonify({"error": "No NAV history available"}), 404
+    if request.args.get('isins'):
+        isins = [i.strip() for i in request.args['isins'].split(',') if i.strip()]
+    elif request.args.get('universe') == 'all':
+        isins = None
     else:
-        # Try running pipeline if data is missing
-        success, msg = run_pipeline()
-        if success:
-             with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-             return jsonify(data)
-        return jsonify({"error": "Data file not found and initial processing failed"}), 404
+        portfolio = get_portfolio()
+        missing = unknown_portfolio(portfolio)
+        if missing: return missing
+        isins = store.read_funds([portfolio])['ISIN'].dropna().astype(str).tolist()
+
+    result = bt.summarize(isins, series=request.args.get('series') == '1', strategy=strategy, amount=amount,
+                          horizon_months=horizon, since=since, stp_months=stp_months, source=request.args.get('source'))
+    result.update({'strategy': strategy, 'amount': amount, 'horizon_years': float(years) if years else None, 'since': since})
+    return jsonify(result)
+
+@app.route('/api/tax')
+def get_tax():
+    """Realized gains per financial year and lots turning long-term soon: ?within=90[&fy=2024]"""
+    import taxlots
+    try:
+        within = int(request.args.get('within', 90))
+        fy = int(request.args['fy']) if request.args.get('fy') else None
+        if within < 0: raise ValueError
+    except ValueError:
+        return jsonify({"error": "within must be a non-negative number of days, fy a starting year (2024 = FY2024-25)"}), 400
+
+    portfolio = get_portfolio()
+    missing = unknown_portfolio(portfolio)
+    if missing: return missing
+    # Serialized with pipeline runs of the portfolio, which sync the same ledger
+    with scheduler.get_scheduler().portfolio_lock(portfolio):
+        ledger = taxlots.get_ledger(portfolio)
+        lots = ledger.turning_long_term(within)
+        fy_summary = ledger.fy_summary(fy, fy)
+    return jsonify({
+        'fy': fy_summary,
+        'turning_long_term': [{'ISIN': l.isin, 'scheme': l.fund_name, 'AMC': l.amc, 'date': l.buy_date, 'lt_date': l.lt_date,
+                               'units': round(l.units_left, 4), 'cost': round(l.units_left * l.price, 2), 'days_left': l.days_left}
+                              for l in lots.itertuples(index=False)],
+    })
+
+@app.route('/api/search')
+def search():
+    """Typo-tolerant search over the scheme master and indices list: ?q=parag flexi[&kind=fund|index][&limit=20]"""
+    import search_index
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('kind') or None
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+        if kind not in (None, 'fund', 'index') or limit <= 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "kind must be fund or index, limit a positive integer"}), 400
+    if not query:
+        return jsonify([])
+    return jsonify(search_index.get_index().search(query, kind=kind, limit=limit))
+
+@app.route('/api/portfolios')
+def get_portfolios():
+    return jsonify(portfolios.list_portfolios())
 
 @app.route('/api/config')
 def get_config():
@@ -74,13 +208,13 @@ def get_config():
 
 @app.route('/api/refresh/nav', methods=['POST'])
 def refresh_nav():
-    success, msg = run_pipeline(force_nav=True)
+    success, msg = run_pipeline(force_nav=True, portfolio=get_portfolio())
     if success: return jsonify({"status": "success", "message": msg})
     return jsonify({"status": "error", "message": msg}), 500
 
 @app.route('/api/refresh/data', methods=['POST'])
 def refresh_data():
-    success, msg = run_pipeline()
+    success, msg = run_pipeline(portfolio=get_portfolio())
     if success: return jsonify({"status": "success", "message": msg})
     return jsonify({"status": "error", "message": msg}), 500
 
@@ -88,39 +222,68 @@ def refresh_data():
 def settings():
     return render_template('settings.html')
 
-@app.route('/api/mf-props', methods=['GET', 'POST'])
+def _table_response(table):
+    rows, version = table.snapshot()
+    resp = jsonify(rows)
+    resp.set_etag(version)
+    return resp
+
+def _expected_version(body):
+    """Version the client last read: the If-Match header or "version" in the body."""
+    if request.if_match and not request.if_match.star_tag:
+        return next(iter(request.if_match), None)
+    return body.get('version') if isinstance(body, dict) else None
+
+def _edit_table(table, on_change=None):
+    """
+    POST replaces the whole table; PATCH {"upsert": [rows], "delete": [keys], "version": v}
+    edits single rows. Both are atomic, and PATCH must name the version it was based on.
+    """
+    import props
+    body = request.get_json(silent=True)
+    expected = _expected_version(body)
+    try:
+        if request.method == 'PATCH':
+            if expected is None:
+                return jsonify({"error": "version required (If-Match header or \"version\")"}), 428
+            if not isinstance(body, dict) or not isinstance(body.get('upsert', []), list) or not isinstance(body.get('delete', []), list):
+                return jsonify({"error": "expected {\"upsert\": [rows], \"delete\": [keys]}"}), 400
+            version = table.upsert(body.get('upsert', []), body.get('delete', []), expected_version=expected)
+        else:
+            rows = body.get('rows') if isinstance(body, dict) else body
+            if not isinstance(rows, list):
+                return jsonify({"error": "expected a list of rows"}), 400
+            version = table.replace(rows, expected_version=expected)
+    except props.VersionConflict as e:
+        return jsonify({"error": "Changed by someone else; reload and retry", "version": e.current}), 409
+    except (ValueError, AttributeError) as e:
+        return jsonify({"error": str(e)}), 400
+    if on_change: on_change()
+    resp = jsonify({"status": "success", "version": version})
+    resp.set_etag(version)
+    return resp
+
+def _apply_props_everywhere():
+    # The props stage re-derives only the props-dependent dashboard sections
+    sched = scheduler.get_scheduler()
+    for p in portfolios.list_portfolios():
+        sched.trigger(p)
+
+@app.route('/api/mf-props', methods=['GET', 'POST', 'PATCH'])
 def handle_mf_props():
-    props_path = 'data/mf-props.csv'
+    import props
+    table = props.get_props(portfolios.PROPS_CSV)
     if request.method == 'GET':
-        if not os.path.exists(props_path):
-            return jsonify([])
-        df = pd.read_csv(props_path)
-        # Handle NaN for valid JSON
-        df = df.fillna("")
-        return jsonify(df.to_dict('records'))
-    else:
-        # POST: Update or Append
-        data = request.json
-        df = pd.DataFrame(data)
-        df.to_csv(props_path, index=False)
-        return jsonify({"status": "success"})
+        return _table_response(table)
+    return _edit_table(table, on_change=_apply_props_everywhere)
 
-@app.route('/api/indices', methods=['GET', 'POST'])
+@app.route('/api/indices', methods=['GET', 'POST', 'PATCH'])
 def handle_indices():
-    indices_path = 'data/indices.csv'
+    import props
+    table = props.get_indices()
     if request.method == 'GET':
-        if not os.path.exists(indices_path):
-            return jsonify([])
-        df = pd.read_csv(indices_path)
-        # Handle NaN for valid JSON
-        df = df.fillna("")
-        return jsonify(df.to_dict('records'))
-    else:
-        # POST: Update full list
-        data = request.json
-        df = pd.DataFrame(data)
-        df.to_csv(indices_path, index=False)
-        return jsonify({"status": "success"})
+        return _table_response(table)
+    return _edit_table(table)
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
@@ -131,20 +294,29 @@ def upload_file():
         return jsonify({"status": "error", "message": "No selected file"}), 400
     
     if file and allowed_file(file.filename):
+        try:
+            portfolio = get_portfolio()
+            paths = portfolios.ensure_portfolio(portfolio)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
         filename = secure_filename(file.filename)
         # Append timestamp to avoid collision
         filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file_path = os.path.join(paths['pdf_dir'], filename)
         file.save(file_path)
         
         password = request.form.get('password')
         
         # Run full pipeline with new file and user password
-        success, msg = run_pipeline(new_pdf=file_path, password=password)
+        success, msg = run_pipeline(new_pdf=file_path, password=password, portfolio=portfolio)
         if success: return jsonify({"status": "success", "message": msg})
         return jsonify({"status": "error", "message": msg}), 500
     
     return jsonify({"status": "error", "message": "File type not allowed"}), 400
 
 if __name__ == '__main__':
+    # Not at import, so tools and WSGI workers spawn no threads (their scheduler starts on the
+    # first trigger); under the debug reloader, only in the child that serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        scheduler.get_scheduler().start()
     app.run(debug=True, port=5000)
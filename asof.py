@@ -0,0 +1,104 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import store
+import processor
+
+class AsOfValuer:
+    """
+    Point-in-time portfolio valuation.
+
+    Per ISIN, the purchase and sale events are turned into sorted date arrays with
+    cumulative units and cost, and the NAV history into sorted (date, nav) arrays.
+    Any date then costs two binary searches per fund. Sales remove units at their FIFO
+    buy price (from realized gains), so the cost matches the FIFO cost basis of open lots.
+    """
+    def __init__(self, cams_df, realized_df, nav_history):
+        p_ev = cams_df[~cams_df['Investment Type'].str.contains('Redemption|Switch Out', case=False, na=False)]
+        events = [pd.DataFrame({'Date': p_ev['Date'], 'ISIN': p_ev['ISIN'], 'Units': p_ev['Units'], 'Cost': p_ev['Units'] * p_ev['Price']})]
+        if not realized_df.empty:
+            events.append(pd.DataFrame({'Date': realized_df['Sell Date'], 'ISIN': realized_df['ISIN'],
+                                        'Units': -realized_df['Units'], 'Cost': -(realized_df['Units'] * realized_df['Buy Price'])}))
+        all_ev = pd.concat(events, ignore_index=True).sort_values('Date', kind='stable')
+
+        self.names = cams_df.drop_duplicates(subset=['ISIN'], keep='last').set_index('ISIN')['Name'].to_dict()
+        self.events = {}
+        for isin, g in all_ev.groupby('ISIN', sort=False, observed=True):
+            self.events[isin] = (g['Date'].values.astype('datetime64[D]'), g['Units'].cumsum().values, g['Cost'].cumsum().values)
+
+        self.navs = {}
+        if not nav_history.empty:
+            nav = nav_history[nav_history['isin'].isin(self.events.keys())].sort_values('date', kind='stable')
+            for isin, g in nav.groupby('isin', sort=False, observed=True):
+                self.navs[isin] = (g['date'].values.astype('datetime64[D]'), g['nav'].values.astype(float))
+
+    @staticmethod
+    def _lookup(dates, values, q):
+        """values at the last date <= each query date (0 before the first date)."""
+        idx = np.searchsorted(dates, q, side='right') - 1
+        return np.where(idx >= 0, values[np.maximum(idx, 0)], 0.0), idx
+
+    def value_many(self, dates):
+        """Valuation for each date in `dates`; returns a list of dicts in the same order."""
+        q = np.asarray(pd.to_datetime(list(dates)).values.astype('datetime64[D]'))
+        results = [{'date': str(d), 'value': 0.0, 'cost': 0.0, 'funds': []} for d in q]
+
+        for isin, (ev_dates, cum_units, cum_cost) in self.events.items():
+            units, _ = self._lookup(ev_dates, cum_units, q)
+            cost, _ = self._lookup(ev_dates, cum_cost, q)
+            if isin in self.navs:
+                nav_dates, nav_vals = self.navs[isin]
+                nav, n_idx = self._lookup(nav_dates, nav_vals, q)
+            else:
+                nav, n_idx = np.zeros(len(q)), np.full(len(q), -1)
+
+            for k in np.nonzero((units > 1e-9) | (np.abs(cost) > 1e-6))[0]:
+                val = float(units[k] * nav[k])
+                results[k]['funds'].append({
+                    'isin': isin,
+                    'fund': self.names.get(isin, isin),
+                    'units': round(float(units[k]), 4),
+                    'cost': round(float(cost[k]), 2),
+                    'nav': round(float(nav[k]), 4),
+                    'nav_date': str(self.navs[isin][0][n_idx[k]]) if n_idx[k] >= 0 else None,
+                    'value': round(val, 2),
+                })
+                results[k]['value'] += val
+                results[k]['cost'] += float(cost[k])
+
+        for r in results:
+            r['value'] = round(r['value'], 2)
+            r['cost'] = round(r['cost'], 2)
+            r['funds'].sort(key=lambda f: -f['value'])
+        return results
+
+    def value(self, date):
+        return self.value_many([date])[0]
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def get_valuer(portfolio=store.DEFAULT_PORTFOLIO, nav_csv=processor.NAV_HISTORY_CSV):
+    """Valuer for a portfolio, rebuilt only when its transactions, realized gains or the NAV store change."""
+    conn = store.connect()
+    try:
+        key = (store.table_version('transactions', portfolio, conn=conn), store.table_version('realized_gains', portfolio, conn=conn),
+               os.path.getmtime(nav_csv) if os.path.exists(nav_csv) else None)
+        with _cache_lock:
+            cached = _cache.get(portfolio)
+            if cached and cached[0] == key:
+                return cached[1]
+        cams_df = store.read_table('transactions', portfolio, conn=conn)
+        realized_df = store.read_table('realized_gains', portfolio, conn=conn)
+    finally:
+        conn.close()
+
+    if cams_df.empty:
+        return None
+    valuer = AsOfValuer(cams_df, realized_df, processor.load_nav_history(nav_csv, isins=cams_df['ISIN'].unique()))
+    with _cache_lock:
+        _cache[portfolio] = (key, valuer)
+    return valuer
@@ -5,6 +5,8 @@ from os import path
 import os
 import numpy as np
 
+import store
+
 def file_processing(file_path, doc_pwd, txt_file):
     """
     Processes a password-protected PDF file, extracts its text content, and writes it to a text file.
@@ -32,7 +34,15 @@ def file_processing(file_path, doc_pwd, txt_file):
     return final_text
 
 
-def extract_text(txt_file, final_csv):
+def extract_text(txt_file, final_csv, portfolio=store.DEFAULT_PORTFOLIO):
+    df = parse_statement(txt_file)
+    if df is None:
+        return False
+    save_data(df, final_csv, portfolio=portfolio)
+    return True
+
+def parse_statement(txt_file):
+    """Parses the extracted statement text into a formatted transactions DataFrame (None if empty)."""
     with open(txt_file, 'r') as f:
         doc_txt = f.read()
 
@@ -68,24 +78,27 @@ def extract_text(txt_file, final_csv):
 
     if not line_items:
         print("No transactions found in PDF.")
-        return False
+        return None
 
     df = pd.DataFrame(line_items)
-    df = formatter(df)
-    save_data(df, final_csv)
-    return True
+    return formatter(df)
 
-def save_data(df, final_csv):
-    if path.isfile(final_csv):
-        old_df = pd.read_csv(final_csv)
-        old_df['Date'] = pd.to_datetime(old_df['Date'], format='mixed')
-        min_date = df['Date'].min()
-        old_df = old_df[old_df['Date'] < min_date]
-        df = pd.concat([old_df, df])
+def save_data(df, final_csv, portfolio=store.DEFAULT_PORTFOLIO):
+    """Merges a statement into the transaction store, refreshes the CSV export and returns the full ledger."""
+    conn = store.connect()
+    try:
+        if not store.has_rows('transactions', portfolio, conn=conn) and path.isfile(final_csv):
+            store.import_csv('transactions', final_csv, portfolio, conn=conn)
+        # Statement supersedes everything from its first transaction onwards
+        store.write_table('transactions', df, portfolio, conn=conn, since=df['Date'].min())
+        df = store.read_table('transactions', portfolio, conn=conn)
+    finally:
+        conn.close()
     
     # Ensure directory for final_csv exists
     os.makedirs(os.path.dirname(final_csv), exist_ok=True)
     df.sort_values('Date', ascending=False).to_csv(final_csv, index=False)
+    return df
 
 
 def formatter(df):
@@ -180,12 +193,12 @@ def formatter(df):
 
     return df
 
-def process_cams_pdf(pdf_path, password, txt_path='data/temp_cams.txt', csv_path='data/cams_mf.csv'):
+def process_cams_pdf(pdf_path, password, txt_path='data/temp_cams.txt', csv_path='data/cams_mf.csv', portfolio=store.DEFAULT_PORTFOLIO):
     try:
         if not os.path.exists(pdf_path): 
             return False, "PDF not found"
         file_processing(pdf_path, password, txt_path)
-        success = extract_text(txt_path, csv_path)
+        success = extract_text(txt_path, csv_path, portfolio=portfolio)
         if success: 
             return True, "Processed successfully"
         return False, "No data extracted"
@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import tempfile
+
+import http_cache
+import processor
+
+# Behaviour check: the mfapi fetchers (processor.get_scheme_master / get_history_nav)
+# go through http_cache on every call, so the local CSVs are served only while the
+# cache entry is fresh or upstream answers 304, and an expired TTL picks up new data.
+# Runs offline against a fake upstream.
+
+# CONFIGURATION
+MASTER_URL = 'https://api.mfapi.in/mf'
+SCHEME_CODE = 100001
+HISTORY_URL = f'{MASTER_URL}/{SCHEME_CODE}'
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, etag=None):
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode() if payload is not None else b''
+        self.headers = {'ETag': etag} if etag else {}
+
+class FakeUpstream:
+    """Stands in for http_cache._session: serves `bodies[url]` with an ETag and honours If-None-Match."""
+    def __init__(self):
+        self.bodies = {}
+        self.requests = []
+
+    def set(self, url, payload):
+        self.bodies[url] = (payload, f'"v{len(self.requests)}-{len(json.dumps(payload))}"')
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(url)
+        payload, etag = self.bodies[url]
+        if (headers or {}).get('If-None-Match') == etag:
+            return FakeResponse(304)
+        return FakeResponse(200, payload, etag)
+
+def master(isin_growth):
+    return [{'schemeCode': SCHEME_CODE, 'schemeName': 'Test Fund', 'isinGrowth': isin_growth, 'isinDivReinvestment': None}]
+
+def history(*navs):
+    return {'meta': {'scheme_name': 'Test Fund', 'isin_growth': 'INF000TEST001'},
+            'data': [{'date': f'{10 + i:02d}-01-2024', 'nav': nav} for i, nav in enumerate(navs)]}
+
+def expire(url):
+    """Ages the cache entry for `url` past its TTL."""
+    meta_path, _ = http_cache._paths(url)
+    with open(meta_path, 'r') as f: meta = json.load(f)
+    meta['fetched_at'] -= http_cache._ttl_for(url) + 1
+    with open(meta_path, 'w') as f: json.dump(meta, f)
+
+def main():
+    failures = []
+
+    def check(step, ok, detail=''):
+        if not ok: failures.append(f"{step}{': ' + detail if detail else ''}")
+
+    upstream = FakeUpstream()
+    with tempfile.TemporaryDirectory() as tmp:
+        http_cache.CACHE_DIR = os.path.join(tmp, 'http_cache')
+        http_cache.MODE = 'live'
+        http_cache._session = upstream
+        processor.SCHEME_MASTER_CSV = os.path.join(tmp, 'scheme_master.csv')
+        processor.HISTORY_DIR = os.path.join(tmp, 'history_nav')
+        os.makedirs(processor.HISTORY_DIR)
+
+        # Scheme master: fetched once, then served from the local CSV while fresh
+        upstream.set(MASTER_URL, master('INF000TEST001'))
+        check("master first fetch", processor.get_scheme_master()['isinGrowth'].tolist() == ['INF000TEST001'])
+        check("master csv written", os.path.exists(processor.SCHEME_MASTER_CSV))
+        n = len(upstream.requests)
+        check("master within TTL", processor.get_scheme_master()['isinGrowth'].tolist() == ['INF000TEST001'])
+        check("master within TTL made no request", len(upstream.requests) == n)
+
+        # Expired TTL with changed upstream: the new master replaces the local CSV
+        upstream.set(MASTER_URL, master('INF000TEST009'))
+        expire(MASTER_URL)
+        check("master expired TTL", processor.get_scheme_master()['isinGrowth'].tolist() == ['INF000TEST009'],
+              "stale local CSV served after the TTL expired")
+        check("master expired TTL revalidated", len(upstream.requests) == n + 1)
+
+        # Expired TTL with unchanged upstream (304): the local CSV is reused
+        expire(MASTER_URL)
+        check("master 304", processor.get_scheme_master()['isinGrowth'].tolist() == ['INF000TEST009'])
+
+        # NAV history: same rules
+        upstream.set(HISTORY_URL, history('10.0'))
+        check("history first fetch", processor.get_history_nav(SCHEME_CODE, 'Test Fund')['nav'].astype(float).tolist() == [10.0])
+        n = len(upstream.requests)
+        check("history within TTL", processor.get_history_nav(SCHEME_CODE, 'Test Fund')['nav'].astype(float).tolist() == [10.0])
+        check("history within TTL made no request", len(upstream.requests) == n)
+        upstream.set(HISTORY_URL, history('10.0', '10.5'))
+        expire(HISTORY_URL)
+        navs = processor.get_history_nav(SCHEME_CODE, 'Test Fund')['nav'].astype(float).tolist()
+        check("history expired TTL", navs == [10.0, 10.5], f"got {navs}")
+        expire(HISTORY_URL)
+        navs = processor.get_history_nav(SCHEME_CODE, 'Test Fund')['nav'].astype(float).tolist()
+        check("history 304", navs == [10.0, 10.5], f"got {navs}")
+        print(f"{len(upstream.requests)} upstream requests")
+
+    for f in failures:
+        print(f"FAIL: {f}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
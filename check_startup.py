@@ -0,0 +1,60 @@
+import sys
+import json
+import statistics
+import subprocess
+
+# CONFIGURATION
+IMPORT_BUDGET_MS = 500 # Cold `import app` in a fresh interpreter (median)
+HEAVY_MODULES = ['pandas', 'numpy', 'pdfplumber', 'requests', 'pyxirr', 'yfinance']
+RUNS = 5
+
+_PROBE = """
+import sys, time, json
+t = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - t) * 1000
+try:
+    import resource
+    rss = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) # kB on Linux
+except ImportError:
+    rss = None # Not available on Windows
+print(json.dumps({{'ms': elapsed, 'rss_mb': rss, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure_import(module, runs=RUNS):
+    """Imports `module` in `runs` fresh interpreters; returns median ms, max RSS and heavy modules loaded."""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                             capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    rss = [s['rss_mb'] for s in samples if s['rss_mb'] is not None]
+    return {
+        'ms': statistics.median(s['ms'] for s in samples),
+        'rss_mb': max(rss) if rss else None,
+        'loaded': sorted(set(m for s in samples for m in s['loaded'])),
+    }
+
+def main():
+    app_stats = measure_import('app')
+    print(f"import app: {app_stats['ms']:.0f} ms (budget {IMPORT_BUDGET_MS} ms), peak RSS: {app_stats['rss_mb'] or 'N/A'} MB")
+
+    try:
+        full = measure_import('pipeline', runs=1)
+        print(f"import pipeline (eager equivalent): {full['ms']:.0f} ms, peak RSS: {full['rss_mb'] or 'N/A'} MB")
+    except subprocess.CalledProcessError:
+        pass # Pipeline dependencies not installed; only the budget matters here
+
+    failed = False
+    if app_stats['loaded']:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(app_stats['loaded'])}")
+        failed = True
+    if app_stats['ms'] > IMPORT_BUDGET_MS:
+        print("FAIL: import-time budget exceeded")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import os
+import sys
+import tempfile
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import processor
+import taxlots
+
+# Behaviour check: the persistent tax-lot ledger (taxlots.TaxLedger, which feeds the
+# realized-gain figures and transition planning) must agree with processor.run_fifo
+# (which feeds the lots and realized_gains tables) after a first sync, after
+# appended transactions, after a statement that rewrites history and after two
+# syncs of a fresh ledger running at the same time.
+
+# CONFIGURATION
+TOLERANCE = 1e-6 # Rupees / units
+FUNDS = [('INF000TEST001', 'Test Flexi Cap Fund', 'Test AMC', 40.0), ('INF000TEST002', 'Test Liquid Fund', 'Other AMC', 1500.0)]
+
+def make_transactions(start='2021-01-10', end='2024-12-10', seed=7):
+    """Monthly purchases in each fund plus redemptions (one of everything held, on a purchase day) across several FYs."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for isin, name, amc, price in FUNDS:
+        for d in pd.date_range(start, end, freq='MS') + pd.Timedelta(days=9):
+            price *= 1 + rng.normal(0.008, 0.03)
+            units = round(5000 / price, 3)
+            rows.append({'Date': d, 'Investment Type': 'SIP', 'ISIN': isin, 'Name': name, 'AMC': amc,
+                         'Units': units, 'Price': round(price, 4), 'Amount': round(units * price, 2)})
+        for d, share in [('2021-11-10', 0.2), ('2022-04-10', 0.3), ('2023-03-28', 0.25), ('2024-06-10', 1.0)]:
+            before = [r for r in rows if r['ISIN'] == isin and r['Date'] <= pd.Timestamp(d)]
+            units = round(sum(r['Units'] for r in before) * share, 3)
+            sell = before[-1]['Price'] if before[-1]['Investment Type'] != 'Redemption' else before[-2]['Price']
+            rows.append({'Date': pd.Timestamp(d), 'Investment Type': 'Redemption', 'ISIN': isin, 'Name': name, 'AMC': amc,
+                         'Units': -units, 'Price': sell, 'Amount': -round(units * sell, 2)})
+    return pd.DataFrame(rows)
+
+def expected(txns):
+    """(FY buckets, open lots) from processor.run_fifo."""
+    nav = pd.DataFrame({'isin': [i for i, *_ in FUNDS], 'date': txns['Date'].max(), 'nav': 1.0})
+    lots, realized = processor.run_fifo(txns, nav)
+    realized = realized.assign(fy=[taxlots.fy_of(d) for d in realized['Sell Date']])
+    buckets = realized.groupby(['fy', 'ISIN', 'Type'])['Gain'].sum()
+    open_lots = lots[lots['units_left'] > TOLERANCE].groupby(['ISIN', 'Date'])['units_left'].sum()
+    return buckets, open_lots
+
+def actual(ledger):
+    """(FY buckets, open lots) from the ledger, in the same shape as expected()."""
+    b = ledger.fy_buckets()
+    buckets = b.groupby(['fy', 'isin', 'type'])['gain'].sum()
+    lots = ledger.turning_long_term(10**6, today=date(1900, 1, 1)) # Every open lot
+    lots = lots.assign(buy_date=pd.to_datetime(lots['buy_date']))
+    open_lots = lots[lots['units_left'] > TOLERANCE].groupby(['isin', 'buy_date'])['units_left'].sum()
+    return buckets, open_lots
+
+def compare(step, ledger, txns):
+    failures = []
+    for what, exp, act in zip(['realized gains per FY/fund/type', 'open lots'], expected(txns), actual(ledger)):
+        exp.index.names = act.index.names = range(exp.index.nlevels)
+        diff = exp.sub(act, fill_value=0).abs()
+        if len(exp) == 0 or diff.max() > TOLERANCE:
+            failures.append(f"{step}: {what} differ from run_fifo (max diff {diff.max() if len(diff) else 'n/a'})")
+    return failures
+
+def main():
+    txns = make_transactions()
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = taxlots.TaxLedger('check', db_path=os.path.join(tmp, 'check.db'))
+
+        # 1. First sync replays everything
+        first = txns[txns['Date'] < '2023-01-01']
+        if ledger.sync(first) != len(first): failures.append("first sync: not every transaction applied")
+        failures += compare("first sync", ledger, first)
+
+        # 2. Appended statement: only the new rows are applied; unchanged input is a no-op
+        applied = ledger.sync(txns)
+        if applied != len(txns) - len(first): failures.append(f"append: applied {applied}, expected {len(txns) - len(first)}")
+        if ledger.sync(txns) != 0: failures.append("re-sync of unchanged transactions applied rows")
+        failures += compare("append", ledger, txns)
+
+        # 3. Rewritten history (a back-dated correction): the ledger is rebuilt
+        rewritten = txns.copy()
+        rewritten.loc[0, 'Units'] += 1.0
+        if ledger.sync(rewritten) != len(rewritten): failures.append("rewrite: ledger was not rebuilt")
+        failures += compare("rewrite", ledger, rewritten)
+
+        total = ledger.fy_buckets()['gain'].sum()
+        _, realized = processor.run_fifo(rewritten, pd.DataFrame({'isin': [i for i, *_ in FUNDS], 'date': rewritten['Date'].max(), 'nav': 1.0}))
+        if abs(total - realized['Gain'].sum()) > TOLERANCE:
+            failures.append(f"realized total {total:.2f} != run_fifo {realized['Gain'].sum():.2f}")
+        print(f"realized gains: {total:.2f} over {len(ledger.fy_summary())} financial years")
+
+        # 4. Concurrent syncs (two requests, or a request and a pipeline run): each event is applied once
+        racing = [taxlots.TaxLedger('race', db_path=os.path.join(tmp, 'check.db')) for _ in range(2)]
+        start, applied = threading.Barrier(len(racing)), []
+        def sync(l):
+            start.wait()
+            applied.append(l.sync(txns))
+        threads = [threading.Thread(target=sync, args=(l,)) for l in racing]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        if sorted(applied) != [0, len(txns)]: failures.append(f"concurrent syncs applied {applied}, expected {[0, len(txns)]}")
+        failures += compare("concurrent syncs", racing[0], txns)
+
+    for f in failures:
+        print(f"FAIL: {f}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import os
+import time
+from contextlib import contextmanager
+
+# Locations of the data files shared between modules.
+#
+# Import-light convention: the modules the web app imports at startup (this one, portfolios,
+# props, scheduler) import nothing heavy at module scope; pandas, numpy and the modules
+# built on them (store, pipeline, search_index, ...) are imported inside the functions and
+# routes that need them. check_startup.py enforces the budget.
+
+# CONFIGURATION
+DEFAULT_PORTFOLIO = 'default'
+DB_PATH = 'data/fundmatrix.db'
+PROPS_CSV = 'data/mf-props.csv'
+INDICES_CSV = 'data/indices.csv'
+SCHEME_MASTER_CSV = 'data/scheme_master.csv'
+NAV_HISTORY_CSV = 'data/full_nav_history.csv'
+SCHEDULER_LOCK = 'data/scheduler.lock'
+
+def file_stamp(file_path):
+    """[mtime_ns, size] of a file (JSON-able, for fingerprints and caches), or None if it does not exist."""
+    if not os.path.exists(file_path): return None
+    st = os.stat(file_path)
+    return [st.st_mtime_ns, st.st_size]
+
+def try_lock(lock_path, blocking=False):
+    """
+    Exclusive lock on `lock_path`, across processes as well as threads (each call opens its own handle).
+
+    Returns the open lock file (release with unlock()), or None if not blocking and another
+    holder has it. The OS drops the lock if the holder dies, so no stale lock files.
+    """
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    f = open(lock_path, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if not blocking: raise
+                    time.sleep(0.1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except OSError:
+        f.close()
+        return None
+    return f
+
+def unlock(lock_file):
+    if os.name == 'nt':
+        import msvcrt
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    lock_file.close() # Closing releases a flock
+
+@contextmanager
+def locked(lock_path):
+    """Blocks until `lock_path` is held; releases it on exit."""
+    lock_file = try_lock(lock_path, blocking=True)
+    try:
+        yield
+    finally:
+        unlock(lock_file)
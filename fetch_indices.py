@@ -1,11 +1,58 @@
-import yfinance as yf
 import os
+import argparse
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import index_store
+import datafiles
 
 # CONFIGURATION
-OUTPUT_DIR = 'indices'
-INDICES_METADATA = 'data/indices.csv'
+OUTPUT_DIR = index_store.STORE_DIR
+INDICES_METADATA = datafiles.INDICES_CSV
+MAX_WORKERS = 4 # Concurrent provider calls
+BATCH_SIZE = 20 # Tickers per provider call
+
+class YFinanceProvider:
+    """Yahoo Finance provider; one `yf.download` call per batch of tickers sharing a start date."""
+    def fetch(self, tickers, start=None):
+        import yfinance as yf # Imported lazily so offline providers work without it
+
+        if start:
+            raw = yf.download(tickers, start=start, group_by='ticker', auto_adjust=True, threads=False, progress=False)
+        else:
+            raw = yf.download(tickers, period='max', group_by='ticker', auto_adjust=True, threads=False, progress=False)
+
+        out = {}
+        for t in tickers:
+            df = raw[t] if isinstance(raw.columns, pd.MultiIndex) and t in raw.columns.get_level_values(0) else pd.DataFrame()
+            df = df.dropna(how='all')
+            if df.empty and not start:
+                # Some tickers reject period="max"; fall back to a shorter window
+                df = yf.Ticker(t).history(period="5y")
+            out[t] = df
+        return out
+
+class FixtureProvider:
+    """Offline provider reading `<fixture_dir>/<ticker>.csv` (Date + price columns), for tests and benchmarks."""
+    def __init__(self, fixture_dir):
+        self.fixture_dir = fixture_dir
+
+    def fetch(self, tickers, start=None):
+        out = {}
+        for t in tickers:
+            file_path = os.path.join(self.fixture_dir, f"{index_store.safe_ticker(t)}.csv")
+            if not os.path.exists(file_path):
+                out[t] = pd.DataFrame()
+                continue
+            df = pd.read_csv(file_path, parse_dates=['Date']).set_index('Date')
+            if start:
+                df = df[df.index >= pd.Timestamp(start)]
+            out[t] = df
+        return out
+
+def index_file_name(name):
+    return str(name).replace(' ', '_').replace('&', 'and').lower()
 
 def get_tickers(only_important=True):
     """Reads indices.csv and returns tickers based on criteria."""
@@ -18,82 +65,80 @@ def get_tickers(only_important=True):
         return df[df['Importance'] == 'important']
     return df
 
-def fetch_data():
-    """Fetches data for indices and commodities with simple date handling and deduplication."""
+def _fetch_batch(provider, tickers, start):
+    try:
+        return provider.fetch(tickers, start=start), None
+    except Exception as e:
+        return {t: pd.DataFrame() for t in tickers}, e
+
+def fetch_data(only_important=True, provider=None, max_workers=MAX_WORKERS, batch_size=BATCH_SIZE):
+    """
+    Fetches data for indices and commodities.
+
+    Tickers are grouped by the date they need data from (the day after their last stored row,
+    read from the index store manifest),
+    split into batches, and the batches are fetched concurrently through `provider`
+    (Yahoo Finance by default) with at most `max_workers` calls in flight.
+    """
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    tickers_df = get_tickers()
-    
+    tickers_df = get_tickers(only_important)
+    if not tickers_df.empty:
+        tickers_df = tickers_df.drop_duplicates(subset=['Ticker'])
+    provider = provider or YFinanceProvider()
+
     if tickers_df.empty:
         print("No tickers found to fetch.")
         return
 
-    print(f"Starting fetch at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}...")
-    
-    for _, row in tickers_df.iterrows():
-        name = str(row['Name']).replace(' ', '_').replace('&', 'and').lower()
-        ticker_symbol = row['Ticker']
-        file_path = os.path.join(OUTPUT_DIR, f"{name}.csv")
-        
-        print(f"Processing {row['Name']} ({ticker_symbol})...")
-        
-        existing_df = pd.DataFrame()
-        start_date = None
-        
-        if os.path.exists(file_path):
-            try:
-                # Read, ensure Date is naive date script
-                existing_df = pd.read_csv(file_path)
-                if not existing_df.empty:
-                    existing_df['Date'] = pd.to_datetime(existing_df['Date']).dt.date
-                    last_date = existing_df['Date'].max()
-                    start_date = last_date.strftime('%Y-%m-%d')
-                    print(f"  Existing data found up to {last_date}. Fetching from {start_date}")
-            except Exception as e:
-                print(f"  Error reading existing file {file_path}: {e}")
-
-        try:
-            ticker = yf.Ticker(ticker_symbol)
-            df = pd.DataFrame()
-            
-            if start_date:
-                df = ticker.history(start=start_date)
-            else:
+    print(f"Starting fetch of {len(tickers_df)} tickers at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}...")
+
+    # Group by start date
+    targets, groups = {}, {}
+    for ticker, name in zip(tickers_df['Ticker'], tickers_df['Name']):
+        # Flat per-index files from earlier versions are imported into the store once
+        index_store.import_legacy(ticker, os.path.join(OUTPUT_DIR, f"{index_file_name(name)}.csv"), name=name)
+    manifest = index_store.load_manifest()
+    for ticker, name in zip(tickers_df['Ticker'], tickers_df['Name']):
+        last_date = index_store.last_date(ticker, manifest)
+        start = (last_date + timedelta(days=1)).strftime('%Y-%m-%d') if last_date else None
+        if last_date and last_date >= datetime.now().date():
+            continue # Already up to date
+        targets[ticker] = name
+        groups.setdefault(start, []).append(ticker)
+
+    batches = [(start, tickers[i:i + batch_size]) for start, tickers in groups.items() for i in range(0, len(tickers), batch_size)]
+
+    updated = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_fetch_batch, provider, tickers, start): (start, tickers) for start, tickers in batches}
+        for fut in as_completed(futures):
+            start, tickers = futures[fut]
+            results, err = fut.result()
+            if err:
+                print(f"  Error fetching batch from {start or 'inception'} ({', '.join(tickers)}): {err}")
+            # Files are written from this thread only
+            for ticker, df in results.items():
+                name = targets[ticker]
                 try:
-                    df = ticker.history(period="max")
-                except Exception:
-                    df = ticker.history(period="10y")
-                
-                if df.empty:
-                    df = ticker.history(period="5y")
-
-            if df.empty:
-                print(f"  No new data found for {ticker_symbol}")
-                # Save sanitized existing data back to ensure format is clean
-                if not existing_df.empty:
-                    existing_df.to_csv(file_path, index=False)
-                continue
-                
-            # Clean and prepare new data
-            df = df.drop(columns=['Dividends', 'Stock Splits'], errors='ignore')
-            df = df.reset_index()
-            
-            # Convert new data Date to naive date
-            df['Date'] = pd.to_datetime(df['Date']).dt.date
-            
-            # Deduplication and merging
-            if not existing_df.empty:
-                combined_df = pd.concat([existing_df, df], ignore_index=True)
-                combined_df = combined_df.drop_duplicates(subset=['Date'], keep='last')
-                combined_df = combined_df.sort_values('Date')
-                combined_df.to_csv(file_path, index=False)
-                print(f"  Updated {file_path} (Total rows: {len(combined_df)})")
-            else:
-                df.to_csv(file_path, index=False)
-                print(f"  Saved {len(df)} rows to {file_path}")
-            
-        except Exception as e:
-            print(f"  Error fetching data for {ticker_symbol}: {e}")
+                    rows = index_store.append(ticker, df, name=name) if df is not None and not df.empty else 0
+                except Exception as e:
+                    print(f"  Error saving data for {ticker}: {e}")
+                    continue
+                if rows:
+                    updated += 1
+                    print(f"  Appended {rows} rows for {name} ({ticker})")
+                elif not err:
+                    print(f"  No new data found for {name} ({ticker})")
+
+    print(f"Updated {updated}/{len(targets)} indices in {len(batches)} batches.")
 
 if __name__ == "__main__":
-    fetch_data()
+    parser = argparse.ArgumentParser(description="Fetch index and commodity history.")
+    parser.add_argument('--all', action='store_true', help="Fetch every entry in indices.csv, not just the important ones")
+    parser.add_argument('--fixtures', help="Read prices from a local fixture directory instead of Yahoo Finance")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Maximum concurrent provider calls")
+    args = parser.parse_args()
+
+    provider = FixtureProvider(args.fixtures) if args.fixtures else YFinanceProvider()
+    fetch_data(only_important=not args.all, provider=provider, max_workers=args.workers)
     print("\nFetch completed.")
@@ -0,0 +1,129 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+import requests
+
+# CONFIGURATION
+CACHE_DIR = os.environ.get('FUNDMATRIX_HTTP_CACHE', 'data/http_cache')
+# live: serve fresh entries, revalidate stale ones with conditional requests
+# record: always download and overwrite the cache (to capture a fixture set)
+# replay: serve only from the cache, never touch the network (offline runs, benchmarks)
+MODE = os.environ.get('FUNDMATRIX_HTTP_MODE', 'live')
+TIMEOUT = 30
+# Seconds a cached response is served without revalidation, first match wins
+TTLS = [
+    (re.compile(r'^https://api\.mfapi\.in/mf/?$'), 24 * 3600), # Scheme master
+    (re.compile(r'^https://api\.mfapi\.in/mf/\d+'), 6 * 3600), # NAV history (published once a day)
+]
+DEFAULT_TTL = 0
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a URL was never recorded."""
+
+class CachedResponse:
+    def __init__(self, status_code, content, headers, from_cache=False, revalidated=False):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.from_cache = from_cache # Body is the stored copy (fresh hit or 304)
+        self.revalidated = revalidated # Upstream answered 304 Not Modified
+
+    def json(self):
+        return json.loads(self.content.decode())
+
+_session = requests.Session()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def _paths(url):
+    key = hashlib.sha1(url.encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json"), os.path.join(CACHE_DIR, f"{key}.body")
+
+def _ttl_for(url):
+    for pat, ttl in TTLS:
+        if pat.match(url): return ttl
+    return DEFAULT_TTL
+
+def _load(url):
+    meta_path, body_path = _paths(url)
+    if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+        return None, None
+    with open(meta_path, 'r') as f: meta = json.load(f)
+    with open(body_path, 'rb') as f: body = f.read()
+    return meta, body
+
+def _write_atomic(file_path, data, mode='wb'):
+    tmp = f"{file_path}.{threading.get_ident()}.tmp"
+    with open(tmp, mode) as f: f.write(data)
+    os.replace(tmp, file_path)
+
+def _store(url, meta, body=None):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta_path, body_path = _paths(url)
+    if body is not None:
+        _write_atomic(body_path, body)
+    _write_atomic(meta_path, json.dumps(meta), mode='w')
+
+def _fetch(url, force_refresh, ttl):
+    meta, body = _load(url)
+
+    if MODE == 'replay':
+        if meta is None: raise CacheMiss(url)
+        return CachedResponse(meta['status'], body, meta['headers'], from_cache=True)
+
+    ttl = _ttl_for(url) if ttl is None else ttl
+    if meta is not None and MODE == 'live' and not force_refresh and time.time() - meta['fetched_at'] < ttl:
+        return CachedResponse(meta['status'], body, meta['headers'], from_cache=True)
+
+    headers = {}
+    if meta is not None and MODE == 'live':
+        if meta['headers'].get('ETag'): headers['If-None-Match'] = meta['headers']['ETag']
+        if meta['headers'].get('Last-Modified'): headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+
+    resp = _session.get(url, headers=headers, timeout=TIMEOUT)
+    if resp.status_code == 304 and meta is not None:
+        meta['fetched_at'] = time.time()
+        _store(url, meta)
+        return CachedResponse(meta['status'], body, meta['headers'], from_cache=True, revalidated=True)
+
+    if resp.status_code == 200:
+        kept = {k: resp.headers[k] for k in ('ETag', 'Last-Modified', 'Content-Type') if k in resp.headers}
+        _store(url, {'url': url, 'status': 200, 'headers': kept, 'fetched_at': time.time()}, resp.content)
+    return CachedResponse(resp.status_code, resp.content, dict(resp.headers))
+
+def get(url, force_refresh=False, ttl=None):
+    """
+    GET through the shared on-disk cache.
+
+    Fresh entries (younger than the endpoint TTL) are served without a request;
+    stale ones are revalidated with If-None-Match / If-Modified-Since so that
+    unchanged upstream data costs a 304. `force_refresh` skips the TTL but still
+    revalidates. Concurrent calls for the same URL share one request.
+    """
+    with _inflight_lock:
+        pending = _inflight.get(url)
+        if pending is None:
+            pending = _inflight[url] = {'event': threading.Event(), 'result': None, 'error': None}
+            owner = True
+        else:
+            owner = False
+
+    if not owner:
+        pending['event'].wait()
+        if pending['error'] is not None: raise pending['error']
+        return pending['result']
+
+    try:
+        pending['result'] = _fetch(url, force_refresh, ttl)
+        return pending['result']
+    except Exception as e:
+        pending['error'] = e
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[url]
+        pending['event'].set()
@@ -0,0 +1,117 @@
+import os
+import json
+import threading
+import pandas as pd
+
+# CONFIGURATION
+STORE_DIR = 'indices'
+MANIFEST_FILE = os.path.join(STORE_DIR, 'manifest.json')
+COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+_lock = threading.Lock()
+
+def safe_ticker(ticker):
+    """File-system-safe form of a ticker, used for its directory here and for fixture file names."""
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in ticker)
+
+def _ticker_dir(ticker):
+    return os.path.join(STORE_DIR, safe_ticker(ticker))
+
+def load_manifest():
+    """{ticker: {'name', 'last_date', 'rows', 'years'}} for every stored index."""
+    if not os.path.exists(MANIFEST_FILE):
+        return {}
+    with open(MANIFEST_FILE, 'r') as f:
+        return json.load(f)
+
+def _save_manifest(manifest):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp = f"{MANIFEST_FILE}.tmp"
+    with open(tmp, 'w') as f: json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(tmp, MANIFEST_FILE)
+
+def last_date(ticker, manifest=None):
+    """Last stored date of `ticker` (a `date`), straight from the manifest; None if not stored."""
+    entry = (manifest if manifest is not None else load_manifest()).get(ticker)
+    return pd.Timestamp(entry['last_date']).date() if entry else None
+
+def _normalize(df):
+    """Date column + price columns, naive dates, one row per day, ascending."""
+    df = df.drop(columns=['Dividends', 'Stock Splits'], errors='ignore')
+    if 'Date' not in df.columns:
+        df = df.reset_index()
+        df = df.rename(columns={df.columns[0]: 'Date'})
+    df = df.reindex(columns=COLUMNS)
+    dates = pd.to_datetime(df['Date'])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    df['Date'] = dates.dt.normalize()
+    return df.drop_duplicates(subset=['Date'], keep='last').sort_values('Date')
+
+def append(ticker, df, name=None):
+    """
+    Appends rows newer than the ticker's last stored date to its year partitions.
+
+    Existing partitions are never rewritten: new rows are appended to
+    `<ticker>/<year>.csv` and the manifest is updated atomically afterwards.
+    Returns the number of rows appended.
+    """
+    with _lock:
+        manifest = load_manifest()
+        entry = manifest.get(ticker, {'name': name, 'last_date': None, 'rows': 0, 'years': []})
+
+        df = _normalize(df)
+        if entry['last_date']:
+            df = df[df['Date'] > pd.Timestamp(entry['last_date'])]
+        if df.empty:
+            return 0
+
+        t_dir = _ticker_dir(ticker)
+        os.makedirs(t_dir, exist_ok=True)
+        for year, part in df.groupby(df['Date'].dt.year):
+            file_path = os.path.join(t_dir, f"{year}.csv")
+            part = part.assign(Date=part['Date'].dt.strftime('%Y-%m-%d'))
+            part.to_csv(file_path, mode='a', header=not os.path.exists(file_path), index=False)
+            if year not in entry['years']:
+                entry['years'] = sorted(entry['years'] + [int(year)])
+
+        entry['last_date'] = df['Date'].max().strftime('%Y-%m-%d')
+        entry['rows'] += len(df)
+        if name: entry['name'] = name
+        manifest[ticker] = entry
+        _save_manifest(manifest)
+        return len(df)
+
+def read_range(ticker, start=None, end=None, manifest=None):
+    """Reads a ticker's rows between `start` and `end` (inclusive), touching only the year partitions in range."""
+    entry = (manifest if manifest is not None else load_manifest()).get(ticker)
+    if not entry:
+        return pd.DataFrame(columns=COLUMNS)
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    years = [y for y in entry['years'] if (start is None or y >= start.year) and (end is None or y <= end.year)]
+    t_dir = _ticker_dir(ticker)
+    frames = [pd.read_csv(os.path.join(t_dir, f"{y}.csv"), parse_dates=['Date']) for y in years]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+
+    df = pd.concat(frames, ignore_index=True)
+    if start is not None: df = df[df['Date'] >= start]
+    if end is not None: df = df[df['Date'] <= end]
+    # An interrupted append may leave rows the manifest never recorded; they are re-appended next run
+    return df.drop_duplicates(subset=['Date'], keep='last').reset_index(drop=True)
+
+def read_closes(tickers, start=None, end=None):
+    """Date x ticker matrix of closing prices for comparing funds against indices."""
+    manifest = load_manifest()
+    series = {t: read_range(t, start, end, manifest=manifest).set_index('Date')['Close'] for t in tickers if t in manifest}
+    if not series:
+        return pd.DataFrame()
+    return pd.DataFrame(series).sort_index()
+
+def import_legacy(ticker, file_path, name=None):
+    """One-off import of a flat `indices/<name>.csv` file written by earlier versions."""
+    if not os.path.exists(file_path) or ticker in load_manifest():
+        return 0
+    return append(ticker, pd.read_csv(file_path), name=name)
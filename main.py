@@ -1,37 +1,30 @@
-import os
-import subprocess
-import sys
+import argparse
 
-def run_script(script_path):
-    print(f"\n>>> Running {script_path}...")
-    try:
-        # Use sys.executable to ensure we use the same python interpreter
-        subprocess.run([sys.executable, script_path], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running {script_path}: {e}")
-        return False
-    return True
+import pipeline
+import portfolios
+import schema
 
 def main():
-    # 1. Extraction (cams.py)
-    # Note: cams.py currently has hardcoded paths. 
-    # In a real scenario, we might want to pass them as arguments.
-    if not run_script('cams.py'):
-        print("Pipeline failed at extraction step.")
-        return
-
-    # 2. Processing (processor.py)
-    if not run_script('processor.py'):
-        print("Pipeline failed at processing step.")
-        return
+    parser = argparse.ArgumentParser(description="Run the FundMatrix pipeline (extraction -> NAV -> FIFO -> analytics).")
+    parser.add_argument('--pdf', help="New CAS PDF to extract (optional)")
+    parser.add_argument('--password', help="Password of the CAS PDF")
+    parser.add_argument('--portfolio', default=portfolios.DEFAULT_PORTFOLIO, help="Portfolio namespace")
+    parser.add_argument('--force-nav', action='store_true', help="Re-download NAV history")
+    parser.add_argument('--force', action='store_true', help="Run every stage even if its inputs are unchanged")
+    args = parser.parse_args()
 
-    # 3. Analytics (analytics.py)
-    if not run_script('analytics.py'):
-        print("Pipeline failed at analytics step.")
+    # Stages run in-process and hand DataFrames to each other in memory;
+    # stages whose input fingerprint is unchanged since the last run are skipped.
+    success, msg = pipeline.run_pipeline(force_nav=args.force_nav, new_pdf=args.pdf, password=args.password,
+                                         portfolio=args.portfolio, force=args.force)
+    if not success:
+        print(f"Pipeline failed: {msg}")
         return
 
     print("\n" + "="*40)
     print("PIPELINE COMPLETED SUCCESSFULLY!")
+    print(msg)
+    print(f"Peak RSS: {schema.peak_rss_mb() or 'N/A'} MB")
     print("Run 'python app.py' to view the dashboard at http://localhost:5000")
     print("="*40)
 
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import hashlib
+from datetime import date
+
+import store
+import cams
+import processor
+import analytics
+import portfolios
+import schema
+import datafiles
+import props
+
+class PipelineError(Exception):
+    pass
+
+class Stage:
+    """
+    One node of the pipeline DAG.
+
+    `run(ctx, inputs)` computes the stage output from its dependencies' outputs,
+    `load(ctx)` rebuilds that output from persisted artifacts when the stage is skipped,
+    `fingerprint(ctx)` returns a JSON-able description of everything the output depends on.
+    """
+    def __init__(self, name, deps, run, load, fingerprint):
+        self.name = name
+        self.deps = deps
+        self.run = run
+        self.load = load
+        self.fingerprint = fingerprint
+
+class Pipeline:
+    def __init__(self, stages, state_path):
+        self.stages = {s.name: s for s in stages}
+        self.state_path = state_path
+
+    def _order(self):
+        order, seen = [], set()
+        def visit(name, path=()):
+            if name in path: raise PipelineError(f"Cycle in pipeline at stage '{name}'")
+            if name in seen: return
+            for dep in self.stages[name].deps:
+                visit(dep, path + (name,))
+            seen.add(name)
+            order.append(name)
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r') as f: return json.load(f)
+            except Exception:
+                pass
+        return {}
+
+    def _save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, 'w') as f: json.dump(state, f, indent=4)
+        os.replace(tmp, self.state_path)
+
+    def _digest(self, stage, ctx):
+        return hashlib.sha1(json.dumps(stage.fingerprint(ctx), sort_keys=True, default=str).encode()).hexdigest()
+
+    def run(self, ctx, force=()):
+        """
+        Runs every stage whose fingerprint changed (or that is named in `force`, True = all).
+
+        Returns (ran, skipped) stage names.
+        """
+        state = self._load_state()
+        outputs, ran, skipped = {}, [], []
+
+        def output(name):
+            # Outputs of skipped stages are only materialized if a later stage needs them
+            if name not in outputs:
+                outputs[name] = self.stages[name].load(ctx)
+            return outputs[name]
+
+        for name in self._order():
+            stage = self.stages[name]
+            forced = force is True or name in force
+            if not forced and state.get(name) == self._digest(stage, ctx):
+                skipped.append(name)
+                continue
+
+            print(f"\n>>> Running stage '{name}'...")
+            started = time.time()
+            outputs[name] = stage.run(ctx, {dep: output(dep) for dep in stage.deps})
+            print(f"    done in {time.time() - started:.2f}s, peak RSS {schema.peak_rss_mb() or 'N/A'} MB")
+            # Fingerprint as of completion, so a stage's own writes (e.g. new ledger rows) don't re-trigger it
+            state[name] = self._digest(stage, ctx)
+            ran.append(name)
+            self._save_state(state)
+
+        return ran, skipped
+
+# --- STAGES ---
+def _held_isins(ctx):
+    return sorted(store.read_funds([ctx['portfolio']])['ISIN'].dropna().unique().tolist())
+
+def _extract_fp(ctx):
+    return {'txn': store.table_version('transactions', ctx['portfolio'])}
+
+def _extract_load(ctx):
+    return store.load_table('transactions', ctx['portfolio'], csv_fallback=ctx['paths']['cams_csv'])
+
+def _extract_run(ctx, inputs):
+    if not ctx['new_pdf']:
+        return _extract_load(ctx)
+    if not ctx['password']: raise PipelineError("Password required for PDF")
+    if not os.path.exists(ctx['new_pdf']): raise PipelineError("CAS Error: PDF not found")
+    paths = ctx['paths']
+    try:
+        cams.file_processing(ctx['new_pdf'], ctx['password'], paths['txt'])
+        df = cams.parse_statement(paths['txt'])
+    except Exception as e:
+        raise PipelineError(f"CAS Error: {e}")
+    if df is None: raise PipelineError("CAS Error: No data extracted")
+    return cams.save_data(df, paths['cams_csv'], portfolio=ctx['portfolio'])
+
+def _nav_fp(ctx):
+    return {'isins': _held_isins(ctx), 'store': os.path.exists(processor.NAV_HISTORY_CSV)}
+
+def _nav_load(ctx):
+    return processor.load_nav_history(processor.NAV_HISTORY_CSV, isins=_held_isins(ctx))
+
+def _nav_run(ctx, inputs):
+    txns = inputs['extract']
+    if txns.empty: raise PipelineError(f"No transactions for portfolio '{ctx['portfolio']}'")
+    isins = txns['ISIN'].dropna().astype(str).unique()
+    history_df = processor.update_nav_store(isins, force_refresh=ctx['force_nav'])
+    # Failing here keeps the stage's fingerprint unrecorded, so the next run fetches again
+    if history_df.empty: raise PipelineError("NAV Error: no NAV history could be fetched")
+    # Schemes mfapi does not list can never be fetched; any other gap is a failed download
+    listed = set(processor.get_scheme_master()['isinGrowth'].dropna().astype(str))
+    failed = sorted((set(isins) - set(history_df['isin'].astype(str))) & listed)
+    if failed: raise PipelineError(f"NAV Error: no NAV history fetched for {', '.join(failed)}")
+    return history_df
+
+def _fifo_fp(ctx):
+    return {'txn': store.table_version('transactions', ctx['portfolio']),
+            'nav': datafiles.file_stamp(processor.NAV_HISTORY_CSV),
+            # Holding periods (STCG/LTCG) move with the calendar
+            'day': date.today().isoformat()}
+
+def _fifo_load(ctx):
+    conn = store.connect()
+    try:
+        return store.read_table('lots', ctx['portfolio'], conn=conn), store.read_table('realized_gains', ctx['portfolio'], conn=conn)
+    finally:
+        conn.close()
+
+def _fifo_run(ctx, inputs):
+    pur_df, realized_df = processor.run_fifo(inputs['extract'], inputs['nav'])
+    if pur_df is None: raise PipelineError("No NAV history available for held schemes")
+    paths = ctx['paths']
+    processor.save_fifo(pur_df, realized_df, ctx['portfolio'], paths['gains_csv'], paths['realized_csv'])
+    return pur_df, realized_df
+
+def _analytics_fp(ctx):
+    p, paths = ctx['portfolio'], ctx['paths']
+    pdfs = [os.path.join(paths['pdf_dir'], f) for f in os.listdir(paths['pdf_dir'])] if os.path.isdir(paths['pdf_dir']) else []
+    return {'txn': store.table_version('transactions', p),
+            'lots': store.table_version('lots', p),
+            'realized': store.table_version('realized_gains', p),
+            'nav': datafiles.file_stamp(processor.NAV_HISTORY_CSV),
+            'pdfs': max((os.path.getmtime(f) for f in pdfs), default=None),
+            'output': os.path.exists(paths['dashboard_json']),
+            'day': date.today().isoformat()}
+
+def _analytics_run(ctx, inputs):
+    pur_df, realized_df = inputs['fifo']
+    # Sections are serialized as they are computed rather than collected into one dict
+    sections = analytics.iter_dashboard(pur_df, inputs['extract'], realized_df, inputs['nav'], portfolios.PROPS_CSV,
+                                        pdf_dir=ctx['paths']['pdf_dir'], portfolio=ctx['portfolio'])
+    written = portfolios.write_dashboard(ctx['paths'], sections)
+    if not written: raise PipelineError("Analytics produced no data")
+    return written
+
+def _props_fp(ctx):
+    return {'props': props.get_props(portfolios.PROPS_CSV).current_version()}
+
+def _props_run(ctx, inputs):
+    if inputs['analytics'] is not None:
+        return inputs['analytics'] # Just built from the current props
+    # Only mf-props changed: patch the props-dependent sections of the existing dashboard
+    paths = ctx['paths']
+    if not os.path.exists(paths['dashboard_json']):
+        return None
+    with open(paths['dashboard_json'], 'r') as f:
+        data = json.load(f)
+    analytics.apply_props(data, analytics.load_props_map(portfolios.PROPS_CSV))
+    portfolios.save_dashboard(paths, data)
+    return data
+
+def build_pipeline(state_path):
+    """extract -> nav -> fifo -> analytics -> props (fifo and analytics also read the extracted ledger)."""
+    return Pipeline([
+        Stage('extract', [], _extract_run, _extract_load, _extract_fp),
+        Stage('nav', ['extract'], _nav_run, _nav_load, _nav_fp),
+        Stage('fifo', ['extract', 'nav'], _fifo_run, _fifo_load, _fifo_fp),
+        Stage('analytics', ['extract', 'nav', 'fifo'], _analytics_run, lambda ctx: None, _analytics_fp),
+        Stage('props', ['analytics'], _props_run, lambda ctx: None, _props_fp),
+    ], state_path)
+
+def run_pipeline(force_nav=False, new_pdf=None, password=None, portfolio=portfolios.DEFAULT_PORTFOLIO, force=False):
+    """Runs the pipeline in-process for one portfolio, skipping stages whose inputs are unchanged."""
+    try:
+        paths = portfolios.ensure_portfolio(portfolio)
+        ctx = {'portfolio': portfolio, 'paths': paths, 'new_pdf': new_pdf, 'password': password, 'force_nav': force_nav}
+        pipe = build_pipeline(os.path.join(paths['base'], 'pipeline_state.json'))
+        # A new statement always re-runs extraction and a NAV refresh always re-fetches
+        forced = True if force else {name for name, on in [('extract', new_pdf), ('nav', force_nav)] if on}
+        ran, skipped = pipe.run(ctx, force=forced)
+        msg = "Pipeline completed successfully"
+        if skipped: msg += f" (up to date: {', '.join(skipped)})"
+        return True, msg
+    except Exception as e:
+        return False, str(e)
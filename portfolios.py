@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import types
+import argparse
+
+import datafiles
+
+# CONFIGURATION
+PORTFOLIOS_DIR = 'portfolios'
+DEFAULT_PORTFOLIO = datafiles.DEFAULT_PORTFOLIO
+PROPS_CSV = datafiles.PROPS_CSV
+
+_NAME_PAT = re.compile(r'^[\w-]+$')
+
+def get_paths(portfolio=DEFAULT_PORTFOLIO):
+    """
+    Returns the ledger/output paths of a portfolio namespace.
+
+    The default portfolio keeps the historical single-portfolio layout under `data/`
+    and `cas_pdf/`; every other portfolio lives in `portfolios/<name>/`.
+    The NAV store and mf-props are shared and not part of the namespace.
+    """
+    if not portfolio or portfolio == DEFAULT_PORTFOLIO:
+        base, pdf_dir = 'data', 'cas_pdf'
+    else:
+        if not _NAME_PAT.match(portfolio):
+            raise ValueError(f"Invalid portfolio name: {portfolio}")
+        base = os.path.join(PORTFOLIOS_DIR, portfolio)
+        pdf_dir = os.path.join(base, 'cas_pdf')
+
+    return {
+        'base': base,
+        'pdf_dir': pdf_dir,
+        'txt': os.path.join(base, 'temp_cams.txt'),
+        'cams_csv': os.path.join(base, 'cams_mf.csv'),
+        'gains_csv': os.path.join(base, 'mf_gains_v2.csv'),
+        'realized_csv': os.path.join(base, 'realized_gains.csv'),
+        'dashboard_json': os.path.join(base, 'dashboard_data.json'),
+    }
+
+def ensure_portfolio(portfolio=DEFAULT_PORTFOLIO):
+    paths = get_paths(portfolio)
+    os.makedirs(paths['base'], exist_ok=True)
+    os.makedirs(paths['pdf_dir'], exist_ok=True)
+    return paths
+
+def write_dashboard(paths, sections):
+    """
+    Streams (name, value) sections into the dashboard as one compact JSON object.
+
+    Each value is encoded on its own as soon as it arrives (generators item by item),
+    so neither the whole payload nor one long section exists as a single string. The
+    file is written next to its final path and renamed into place, so readers never see
+    a partial file. Returns the section names, or None (old file kept) if there were none.
+    """
+    # One-shot encode() without indent runs json's C encoder; floats use the shortest repr
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    tmp = f"{paths['dashboard_json']}.tmp"
+    names = []
+    try:
+        with open(tmp, 'w', buffering=1 << 20) as f:
+            f.write('{')
+            for name, value in sections:
+                f.write(f"{',' if names else ''}{encode(name)}:")
+                if isinstance(value, types.GeneratorType):
+                    f.write('[')
+                    for i, item in enumerate(value):
+                        f.write(f"{',' if i else ''}{encode(item)}")
+                    f.write(']')
+                else:
+                    f.write(encode(value))
+                names.append(name)
+            f.write('}')
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp) # open() itself may have failed
+        raise
+    if not names:
+        os.remove(tmp)
+        return None
+    os.replace(tmp, paths['dashboard_json'])
+    return names
+
+def save_dashboard(paths, data):
+    """Writes a complete dashboard dict (see write_dashboard)."""
+    write_dashboard(paths, data.items())
+
+def list_portfolios():
+    """Lists every portfolio that has transactions in the store or a (legacy) ledger CSV."""
+    import store
+    found = set(store.list_portfolios())
+    if os.path.exists(get_paths(DEFAULT_PORTFOLIO)['cams_csv']):
+        found.add(DEFAULT_PORTFOLIO)
+    if os.path.isdir(PORTFOLIOS_DIR):
+        for name in os.listdir(PORTFOLIOS_DIR):
+            if name != DEFAULT_PORTFOLIO and _NAME_PAT.match(name) and os.path.exists(get_paths(name)['cams_csv']):
+                found.add(name)
+    return sorted(found)
+
+def _read_funds(portfolios):
+    import store
+    conn = store.connect()
+    try:
+        for p in portfolios:
+            # Migrate legacy ledgers so the union below sees them
+            store.ensure_imported('transactions', p, get_paths(p)['cams_csv'], conn=conn)
+        return store.read_funds(portfolios, conn=conn)
+    finally:
+        conn.close()
+
+def refresh_nav_store(portfolios=None, force_refresh=False):
+    """Fetches NAV history once for the union of ISINs held across portfolios."""
+    import processor
+    import analytics
+    portfolios = list_portfolios() if portfolios is None else portfolios
+    funds = _read_funds(portfolios)
+    if funds.empty:
+        return funds
+    print(f"Refreshing NAV store for {funds['ISIN'].nunique()} schemes across {len(portfolios)} portfolios...")
+    processor.update_nav_store(funds['ISIN'].unique(), force_refresh=force_refresh)
+
+    # Register unseen funds here so pool workers never race on mf-props.csv
+    analytics.discover_props(analytics.load_props_map(PROPS_CSV), funds, PROPS_CSV)
+    return funds
+
+def recompute_portfolio(portfolio, history_df=None):
+    """Runs FIFO and analytics for one portfolio against the shared NAV store (no network)."""
+    import processor
+    import analytics
+    paths = ensure_portfolio(portfolio)
+    if history_df is None:
+        history_df = processor.load_nav_history()
+
+    processor.process_mf_data(paths['cams_csv'], paths['gains_csv'], paths['realized_csv'], history_df=history_df, portfolio=portfolio)
+    inputs = analytics.load_inputs(paths['gains_csv'], paths['realized_csv'], processor.NAV_HISTORY_CSV,
+                                   cams_csv=paths['cams_csv'], portfolio=portfolio)
+    if inputs is None:
+        return False
+    # Streamed section by section, so peak memory stays flat across a batch of portfolios
+    sections = analytics.iter_dashboard(*inputs, PROPS_CSV, pdf_dir=paths['pdf_dir'], portfolio=portfolio)
+    return write_dashboard(paths, sections) is not None
+
+_worker_history = None
+
+def _init_worker():
+    # Load the shared NAV store once per worker process, not once per portfolio
+    import processor
+    global _worker_history
+    _worker_history = processor.load_nav_history()
+
+def _recompute_worker(portfolio):
+    try:
+        return portfolio, recompute_portfolio(portfolio, history_df=_worker_history), None
+    except Exception as e:
+        return portfolio, False, str(e)
+
+def recompute_all(force_nav=False, workers=None, portfolios=None):
+    """Refreshes the shared NAV store once, then recomputes every portfolio in a process pool."""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    portfolios = list_portfolios() if portfolios is None else portfolios
+    if not portfolios:
+        print("No portfolios found.")
+        return {}
+
+    refresh_nav_store(portfolios, force_refresh=force_nav)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(_recompute_worker, p) for p in portfolios]
+        for fut in as_completed(futures):
+            portfolio, ok, err = fut.result()
+            results[portfolio] = ok
+            print(f"  {portfolio}: {'ok' if ok else 'failed'}{f' ({err})' if err else ''}")
+
+    print(f"Recomputed {sum(results.values())}/{len(portfolios)} portfolios.")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute all portfolios after a single NAV refresh.")
+    parser.add_argument('--force-nav', action='store_true', help="Re-download NAV history for every held scheme")
+    parser.add_argument('--workers', type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument('portfolios', nargs='*', help="Portfolio names (default: all)")
+    args = parser.parse_args()
+    recompute_all(force_nav=args.force_nav, workers=args.workers, portfolios=args.portfolios or None)
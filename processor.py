@@ -1,85 +1,183 @@
 import re
 import pandas as pd
-import requests
-import json
 import numpy as np
 from datetime import datetime
 import os
 
+import store
+import schema
+import http_cache
+import datafiles
+
 HISTORY_DIR = r"q:\mf\history_nav"
+NAV_HISTORY_CSV = datafiles.NAV_HISTORY_CSV
+SCHEME_MASTER_CSV = datafiles.SCHEME_MASTER_CSV
 
 def get_history_nav(scheme_code, scheme_name, force_refresh=False):
+    """
+    NAV history of one scheme, always through http_cache so the endpoint TTL applies.
+
+    The parsed copy on disk is reused only while upstream is unchanged (fresh
+    cache entry or 304); on network errors it is the fallback.
+    """
     safe_name = re.sub(r'[^\w\s-]', '', scheme_name).strip().replace(' ', '_')
     file_path = os.path.join(HISTORY_DIR, f"{scheme_code}_{safe_name}.csv")
 
     try:
-        if force_refresh or not os.path.exists(file_path):
-            url = f'https://api.mfapi.in/mf/{scheme_code}'
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = json.loads(response.content.decode())
-                temp_df = pd.DataFrame(data['data'])
-                temp_df['scheme_name'] = data['meta']['scheme_name']
-                temp_df['isin'] = data['meta']['isin_growth']
-                temp_df.to_csv(file_path, index=False)
-                return temp_df
-            else:
-                return pd.DataFrame()
-        else:
+        response = http_cache.get(f'https://api.mfapi.in/mf/{scheme_code}', force_refresh=force_refresh)
+        if response.status_code != 200:
+            return pd.DataFrame()
+        if response.from_cache and os.path.exists(file_path):
             return pd.read_csv(file_path)
+        data = response.json()
+        temp_df = pd.DataFrame(data['data'])
+        temp_df['scheme_name'] = data['meta']['scheme_name']
+        temp_df['isin'] = data['meta']['isin_growth']
+        temp_df.to_csv(file_path, index=False)
+        return temp_df
     except Exception as e:
         print(f"Error fetching/reading {scheme_code}: {e}")
+        if os.path.exists(file_path):
+            return pd.read_csv(file_path)
         return pd.DataFrame()
 
-def process_mf_data(input_csv, output_gains_csv, output_realized_csv, force_refresh=False):
-    if not os.path.exists(input_csv):
-        print(f"Error: {input_csv} not found.")
-        return
+def get_scheme_master(force_refresh=False):
+    """Returns the mfapi scheme master, cached on disk (24h TTL, see http_cache) and shared by all portfolios."""
+    try:
+        response = http_cache.get('https://api.mfapi.in/mf', force_refresh=force_refresh)
+        if response.from_cache and os.path.exists(SCHEME_MASTER_CSV):
+            return pd.read_csv(SCHEME_MASTER_CSV)
+        all_mf = pd.DataFrame(response.json())
+        os.makedirs(os.path.dirname(SCHEME_MASTER_CSV), exist_ok=True)
+        all_mf.to_csv(SCHEME_MASTER_CSV, index=False)
+        return all_mf
+    except Exception as e:
+        print(f"Error fetching scheme master: {e}")
+        if os.path.exists(SCHEME_MASTER_CSV):
+            return pd.read_csv(SCHEME_MASTER_CSV)
+        return pd.DataFrame()
 
+def load_nav_history(nav_csv=NAV_HISTORY_CSV, isins=None):
+    """Reads the shared NAV store (typed, see schema.py), optionally restricted to a set of ISINs."""
+    if not os.path.exists(nav_csv):
+        return pd.DataFrame()
+    history_df = schema.read_nav_csv(nav_csv)
+    if isins is not None:
+        history_df = history_df[history_df['isin'].isin(isins)]
+    return history_df
+
+def update_nav_store(isins, force_refresh=False, nav_csv=NAV_HISTORY_CSV):
+    """
+    Fetches NAV history for the given ISINs (each scheme once) and merges it into the shared store.
+
+    Rows for ISINs not requested are kept as-is, so one store can serve many portfolios.
+    Refreshes are serialized across threads and processes by a lock file next to the store
+    (each one reads, merges and rewrites it), and the store is replaced by atomic rename.
+    Returns the history of the requested ISINs only.
+    """
+    with datafiles.locked(f"{nav_csv}.lock"):
+        return _update_nav_store(isins, force_refresh, nav_csv)
+
+def _update_nav_store(isins, force_refresh, nav_csv):
     if not os.path.exists(HISTORY_DIR):
         os.makedirs(HISTORY_DIR)
 
-    df = pd.read_csv(input_csv)
-    df['Date'] = pd.to_datetime(df['Date'], format='mixed', dayfirst=True)
-    df['Fund Name'] = df['Name']
-
-    try:
-        all_mf = pd.DataFrame(json.loads(requests.get('https://api.mfapi.in/mf').content.decode()))
-        found_mfs = all_mf[all_mf['isinGrowth'].isin(df['ISIN'].unique())]
-    except Exception:
-        return
+    all_mf = get_scheme_master(force_refresh=force_refresh)
+    if all_mf.empty:
+        return pd.DataFrame()
+    found_mfs = all_mf[all_mf['isinGrowth'].isin(set(isins))].drop_duplicates(subset=['schemeCode'])
 
-    history_df = pd.DataFrame()
+    frames = []
     for i, j in found_mfs.iterrows():
         df_scheme = get_history_nav(j['schemeCode'], j['schemeName'], force_refresh=force_refresh)
         if not df_scheme.empty:
-            history_df = pd.concat([history_df, df_scheme])
+            frames.append(df_scheme)
 
-    if history_df.empty: return
+    if not frames: return pd.DataFrame()
+    history_df = pd.concat(frames, ignore_index=True)
 
-    history_df['date'] = history_df['date'].apply(lambda x: '-'.join(x.split('-')[::-1]))
-    history_df['date'] = pd.to_datetime(history_df['date'])
+    # mfapi dates are DD-MM-YYYY
+    history_df['date'] = pd.to_datetime(history_df['date'].astype('category'), format='%d-%m-%Y')
     history_df['nav'] = pd.to_numeric(history_df['nav'])
-    history_df.sort_values(by=['isin', 'date'], ascending=False, inplace=True)
-    
+    history_df = schema.typed(history_df.drop_duplicates(subset=['isin', 'date']), 'nav')
+
+    store_df = history_df
+    existing = load_nav_history(nav_csv)
+    if not existing.empty:
+        existing = existing[~existing['isin'].isin(history_df['isin'].unique())]
+        # Categories differ between the two frames; re-type the union
+        store_df = schema.typed(pd.concat([existing, history_df], ignore_index=True), 'nav')
+    store_df = store_df.sort_values(by=['isin', 'date'], ascending=False)
+
     # Save full combined history for analytics usage
-    history_df.to_csv('data/full_nav_history.csv', index=False)
+    os.makedirs(os.path.dirname(nav_csv) or '.', exist_ok=True)
+    tmp = f"{nav_csv}.tmp" # Only the lock holder writes it
+    try:
+        store_df.to_csv(tmp, index=False)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    os.replace(tmp, nav_csv)
+
+    history_df.sort_values(by=['isin', 'date'], ascending=False, inplace=True)
+    return history_df
+
+def process_mf_data(input_csv, output_gains_csv, output_realized_csv, force_refresh=False, history_df=None,
+                    portfolio=store.DEFAULT_PORTFOLIO):
+    """
+    Runs NAV lookup and FIFO matching for one portfolio's transactions.
+
+    Transactions are read from the store (`input_csv` is only imported when the
+    portfolio has none yet); lots and realized gains are written back to it.
+    The output CSVs are exports and are skipped when their path is None.
+    If `history_df` is given (e.g. a batch run that already refreshed the shared
+    NAV store), no network calls are made.
+    """
+    df = store.load_table('transactions', portfolio, csv_fallback=input_csv)
+    if df.empty:
+        print(f"Error: no transactions for portfolio '{portfolio}' ({input_csv} not found).")
+        return
+
+    if history_df is None:
+        history_df = update_nav_store(df['ISIN'].unique(), force_refresh=force_refresh)
+
+    pur_df, realized_df = run_fifo(df, history_df)
+    if pur_df is None: return
+    save_fifo(pur_df, realized_df, portfolio, output_gains_csv, output_realized_csv)
+    print("Processing complete.")
 
-    today_nav_df = history_df.groupby('isin').first().reset_index()
-    today_nav_df.columns = ['isin', 'date_last', 'nav_last', 'scheme_name']
-    today_nav_df.drop(columns='scheme_name', inplace=True)
+def save_fifo(pur_df, realized_df, portfolio=store.DEFAULT_PORTFOLIO, output_gains_csv=None, output_realized_csv=None):
+    store.write_table('realized_gains', realized_df, portfolio)
+    if output_realized_csv:
+        realized_df.to_csv(output_realized_csv, index=False)
+    store.write_table('lots', pur_df, portfolio)
+    if output_gains_csv:
+        pur_df.to_csv(output_gains_csv, index=False)
+
+def run_fifo(df, history_df):
+    """
+    Matches redemptions against purchases (FIFO) and values the open lots at the latest NAV.
+
+    Returns (lots, realized gains) DataFrames, or (None, None) if no NAV history is available.
+    """
+    if history_df.empty: return None, None # Also covers a missing store / failed fetch (no columns at all)
+    df = df.assign(**{'Fund Name': df['Name']})
+    history_df = history_df[history_df['isin'].isin(df['ISIN'].unique())]
+    history_df = history_df.sort_values(by=['isin', 'date'], ascending=False)
+
+    if history_df.empty: return None, None
+
+    today_nav_df = history_df.groupby('isin', observed=True)[['date', 'nav']].first().reset_index()
+    today_nav_df.columns = ['isin', 'date_last', 'nav_last']
 
     df = df.merge(today_nav_df, left_on=['ISIN'], right_on=['isin'], how='left')
 
-    # FIFO Logic
-    red_df = df[df['Investment Type'] == 'Redemption'].copy()
-    pur_df = df[df['Investment Type'] != 'Redemption'].copy()
-    
+    # FIFO Logic (sort_values already returns new frames; no extra copies needed)
+    is_red = df['Investment Type'] == 'Redemption'
+    red_df = df[is_red].sort_values('Date')
+    pur_df = df[~is_red].sort_values('Date', ignore_index=True)
+
     pur_df['units_left'] = pur_df['Units']
-    
-    red_df.sort_values('Date', inplace=True)
-    pur_df.sort_values('Date', inplace=True)
-    pur_df.reset_index(drop=True, inplace=True)
 
     realized_gains = []
 
@@ -120,22 +218,17 @@ def process_mf_data(input_csv, output_gains_csv, output_realized_csv, force_refr
                 'Days Held': days_held
             })
 
-    # Save Realized Gains
-    if realized_gains:
-        pd.DataFrame(realized_gains).to_csv(output_realized_csv, index=False)
-    else:
-        # Create empty if no realized gains
-        pd.DataFrame(columns=['Fund Name', 'ISIN', 'Buy Date', 'Sell Date', 'Units', 'Buy Price', 'Sell Price', 'Gain', 'Type', 'Days Held']).to_csv(output_realized_csv, index=False)
+    # Realized Gains (empty frame keeps the columns if nothing was redeemed)
+    realized_df = pd.DataFrame(realized_gains, columns=['Fund Name', 'ISIN', 'Buy Date', 'Sell Date', 'Units', 'Buy Price', 'Sell Price', 'Gain', 'Type', 'Days Held'])
 
-    # Save Holding Status (Unrealized)
+    # Holding Status (Unrealized)
     pur_df['current_val'] = pur_df['units_left'] * pur_df['nav_last']
     pur_df['invested_val'] = pur_df['units_left'] * pur_df['Price']
     pur_df['unrealized_gain'] = pur_df['current_val'] - pur_df['invested_val']
     pur_df['holding_days'] = (datetime.now() - pur_df['Date']).dt.days
     pur_df['gain_type'] = np.where(pur_df['holding_days'] > 365, 'LTCG', 'STCG')
-    
-    pur_df.to_csv(output_gains_csv, index=False)
-    print("Processing complete.")
+
+    return pur_df, realized_df
 
 if __name__ == "__main__":
     process_mf_data('data/cams_mf.csv', 'data/mf_gains_v2.csv', 'data/realized_gains.csv')
@@ -0,0 +1,151 @@
+import os
+import io
+import csv
+import hashlib
+import threading
+
+import datafiles
+
+# CONFIGURATION
+PROPS_CSV = datafiles.PROPS_CSV
+INDICES_CSV = datafiles.INDICES_CSV
+PROPS_COLUMNS = ['ISIN', 'Name', 'Type', 'Sector', 'Cap']
+INDICES_COLUMNS = ['ID', 'Ticker', 'Name', 'Exchange', 'Importance', 'Category']
+PROPS_DEFAULTS = {'Type': 'Others', 'Sector': 'Others', 'Cap': 'Others'}
+INDICES_DEFAULTS = {'Importance': 'normal', 'Category': 'Others'}
+
+class VersionConflict(Exception):
+    """The table changed since the version the caller last read."""
+    def __init__(self, current):
+        super().__init__(f"Table was modified (current version {current})")
+        self.current = current
+
+class KeyedTable:
+    """
+    A small user-editable CSV table held in memory as an ordered {key: row} dict.
+
+    Lookups by key are dict lookups, and a row-level edit rewrites the file through a
+    temp file renamed into place, so readers (and other processes) only ever see the
+    old or the new table. `version` is a digest of the file contents; writers pass the
+    version they read and get a VersionConflict if someone else wrote in between.
+    The file is re-read whenever its stamp changes, so hand edits are picked up too.
+    """
+    def __init__(self, path, key, columns, defaults=None, auto_key=False):
+        self.path = path
+        self.key = key
+        self.columns = list(columns)
+        self.defaults = defaults or {}
+        self.auto_key = auto_key # Missing keys are assigned max + 1 (numeric IDs)
+        self._rows = {}
+        self._stamp = None
+        self.version = None
+        self._lock = threading.RLock()
+
+    def _refresh(self):
+        stamp = datafiles.file_stamp(self.path)
+        if stamp is not None and stamp == self._stamp:
+            return
+        rows, raw = {}, b''
+        if stamp is not None:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            reader = csv.DictReader(io.StringIO(raw.decode('utf-8')))
+            self.columns += [c for c in reader.fieldnames or [] if c not in self.columns]
+            for row in reader:
+                if row.get(self.key):
+                    rows[row[self.key]] = {c: row.get(c) or '' for c in self.columns} # Last duplicate wins
+        self._rows, self._stamp = rows, stamp
+        self.version = hashlib.sha1(raw).hexdigest()[:16]
+
+    def _write(self, rows):
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=self.columns, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows.values())
+        raw = out.getvalue().encode('utf-8')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'wb') as f: f.write(raw)
+        os.replace(tmp, self.path)
+        self._rows, self._stamp = rows, datafiles.file_stamp(self.path)
+        self.version = hashlib.sha1(raw).hexdigest()[:16]
+
+    def _check(self, expected_version):
+        if expected_version is not None and expected_version != self.version:
+            raise VersionConflict(self.version)
+
+    def snapshot(self):
+        """(rows as a list of dicts, version), consistent with each other."""
+        with self._lock:
+            self._refresh()
+            return [dict(r) for r in self._rows.values()], self.version
+
+    def current_version(self):
+        with self._lock:
+            self._refresh()
+            return self.version
+
+    def index(self):
+        """The current {key: row} dict. Treat as read-only; edits go through upsert()."""
+        with self._lock:
+            self._refresh()
+            return self._rows
+
+    def get(self, key):
+        return self.index().get(str(key))
+
+    def _merge(self, current, rows, delete):
+        new = dict(current)
+        for key in delete:
+            new.pop(str(key), None)
+        next_id = max((int(k) for k in new if k.isdigit()), default=0) + 1
+        for row in rows:
+            key = str(row.get(self.key) or '')
+            if not key:
+                if not self.auto_key:
+                    raise ValueError(f"Every row needs a {self.key}")
+                key, next_id = str(next_id), next_id + 1
+            unknown = set(row) - set(self.columns)
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+            base = new.get(key) or {c: self.defaults.get(c, '') for c in self.columns}
+            new[key] = {**base, **{c: '' if v is None else str(v) for c, v in row.items()}, self.key: key}
+        return new
+
+    def upsert(self, rows=(), delete=(), expected_version=None):
+        """
+        Merges `rows` into the table by key (only the given fields change; new rows get the
+        defaults) and removes the keys in `delete`, in one atomic write. Returns the new version.
+        """
+        with self._lock:
+            self._refresh()
+            self._check(expected_version)
+            new = self._merge(self._rows, rows, delete)
+            if new != self._rows:
+                self._write(new)
+            return self.version
+
+    def replace(self, rows, expected_version=None):
+        """Replaces the whole table (the settings page's bulk save). Returns the new version."""
+        with self._lock:
+            self._refresh()
+            self._check(expected_version)
+            self._write(self._merge({}, rows, ()))
+            return self.version
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+def _table(path, *args, **kwargs):
+    with _tables_lock:
+        if path not in _tables:
+            _tables[path] = KeyedTable(path, *args, **kwargs)
+        return _tables[path]
+
+def get_props(props_csv=PROPS_CSV):
+    """The process-wide ISIN-keyed fund props table."""
+    return _table(props_csv, 'ISIN', PROPS_COLUMNS, PROPS_DEFAULTS)
+
+def get_indices(indices_csv=INDICES_CSV):
+    """The process-wide ID-keyed indices table."""
+    return _table(indices_csv, 'ID', INDICES_COLUMNS, INDICES_DEFAULTS, auto_key=True)
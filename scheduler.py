@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import random
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import datafiles
+import portfolios
+
+# CONFIGURATION
+# AMFI publishes the day's NAVs in the evening (IST); refresh after each of these times
+REFRESH_TIMES = os.environ.get('FUNDMATRIX_REFRESH_TIMES', '21:30,23:30')
+JITTER_MINUTES = float(os.environ.get('FUNDMATRIX_REFRESH_JITTER', '10')) # Random delay added to every slot
+ENABLED = os.environ.get('FUNDMATRIX_SCHEDULER', '1') != '0'
+STATUS_FILE = 'data/scheduler_status.json'
+
+def parse_times(spec):
+    """'21:30,23:30' -> [(21, 30), (23, 30)], sorted."""
+    times = []
+    for part in spec.split(','):
+        if part.strip():
+            h, m = part.strip().split(':')
+            times.append((int(h), int(m)))
+    return sorted(times)
+
+def last_slot(now, times):
+    """Most recent scheduled slot at or before `now` (without jitter)."""
+    for days in range(0, 2):
+        day = (now - timedelta(days=days)).date()
+        for h, m in reversed(times):
+            slot = datetime.combine(day, datetime.min.time()).replace(hour=h, minute=m)
+            if slot <= now:
+                return slot
+    return None
+
+def next_slot(now, times, jitter_minutes=0):
+    """First scheduled slot after `now`, plus a random jitter of up to `jitter_minutes`."""
+    for days in range(0, 2):
+        day = (now + timedelta(days=days)).date()
+        for h, m in times:
+            slot = datetime.combine(day, datetime.min.time()).replace(hour=h, minute=m)
+            if slot > now:
+                return slot + timedelta(seconds=random.uniform(0, jitter_minutes * 60))
+    return None
+
+class Scheduler:
+    """
+    Background NAV refresh and analytics recompute.
+
+    At each configured time (plus jitter) the shared NAV store is refreshed once and every
+    portfolio's pipeline is re-run, which writes its dashboard with an atomic rename, so
+    readers only ever see the previous or the new file. Runs (scheduled, triggered or
+    manual) are serialized per portfolio, and the outcome of the last run is kept in
+    `STATUS_FILE` for the status endpoint.
+
+    Scheduled runs happen in one process only: the one holding `lock_file` (the first to
+    start; with several web workers, run `python scheduler.py` next to them). In the other
+    processes the thread only serves trigger().
+    """
+    def __init__(self, times=REFRESH_TIMES, jitter_minutes=JITTER_MINUTES, status_file=STATUS_FILE,
+                 lock_file=datafiles.SCHEDULER_LOCK):
+        self.times = parse_times(times)
+        self.jitter_minutes = jitter_minutes
+        self.status_file = status_file
+        self.lock_file = lock_file
+        self.status = self._load_status()
+        self.status.update({'running': False, 'next_run': None, 'times': [f"{h:02d}:{m:02d}" for h, m in self.times],
+                            'jitter_minutes': jitter_minutes})
+        self._status_lock = threading.Lock() # Every change to self.status, and its save
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = set() # Portfolios queued by trigger()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._schedule_lock = None # Held lock_file, if this process runs the schedule
+
+    def _load_status(self):
+        if os.path.exists(self.status_file):
+            try:
+                with open(self.status_file, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {'last_run': None, 'portfolios': {}}
+
+    def _update_status(self, portfolio=None, **changes):
+        """Applies `changes` to the status (or to one portfolio's entry) and saves a snapshot of it."""
+        with self._status_lock:
+            if portfolio is None:
+                self.status.update(changes)
+            else:
+                self.status['portfolios'][portfolio] = changes
+            snapshot = json.dumps(self.status, indent=4)
+            # Unique temp file: other processes write the same status file
+            status_dir = os.path.dirname(self.status_file) or '.'
+            os.makedirs(status_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=status_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f: f.write(snapshot)
+                os.replace(tmp, self.status_file)
+            except BaseException:
+                if os.path.exists(tmp): os.remove(tmp)
+                raise
+
+    def portfolio_lock(self, portfolio):
+        with self._locks_lock:
+            return self._locks.setdefault(portfolio, threading.Lock())
+
+    def run_portfolio(self, portfolio, **kwargs):
+        """Runs the pipeline for one portfolio under its lock and records the outcome."""
+        import pipeline
+        started = time.time()
+        with self.portfolio_lock(portfolio):
+            try:
+                ok, msg = pipeline.run_pipeline(portfolio=portfolio, **kwargs)
+            except Exception as e:
+                ok, msg = False, str(e)
+        self._update_status(portfolio, finished_at=datetime.now().isoformat(timespec='seconds'),
+                            seconds=round(time.time() - started, 2), ok=ok, message=msg)
+        return ok, msg
+
+    def run_all(self, refresh_nav=True):
+        """One scheduled run: a single NAV refresh for all portfolios, then a recompute of each."""
+        self._update_status(running=True)
+        started = datetime.now()
+        error = None
+        names = portfolios.list_portfolios()
+        try:
+            if refresh_nav:
+                portfolios.refresh_nav_store(names, force_refresh=True)
+        except Exception as e:
+            error = f"NAV refresh failed: {e}"
+        results = {p: self.run_portfolio(p)[0] for p in names}
+        self._update_status(running=False, last_run={
+            'started_at': started.isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'ok': error is None and all(results.values()), 'error': error,
+        })
+        return results
+
+    def trigger(self, portfolio):
+        """Queues a background run for `portfolio` (e.g. its dashboard has never been built)."""
+        self._pending.add(portfolio)
+        self.start()
+        self._wake.set()
+
+    def _catch_up_needed(self, now):
+        # A slot passed while the app was not running
+        slot = last_slot(now, self.times)
+        last = (self.status.get('last_run') or {}).get('started_at')
+        return slot is not None and (last is None or datetime.fromisoformat(last) < slot)
+
+    def _loop(self):
+        if self.times and self._catch_up_needed(datetime.now()):
+            self.run_all()
+        while True:
+            due = next_slot(datetime.now(), self.times, self.jitter_minutes) if self.times else None
+            with self._status_lock:
+                self.status['next_run'] = due.isoformat(timespec='seconds') if due else None
+            while True:
+                self._wake.wait(timeout=None if due is None else max(0.0, (due - datetime.now()).total_seconds()))
+                self._wake.clear()
+                while self._pending:
+                    self.run_portfolio(self._pending.pop())
+                if due is not None and datetime.now() >= due:
+                    break
+            self.run_all()
+
+    def start(self):
+        # Concurrent trigger() calls must not start two loops
+        with self._start_lock:
+            if self._thread is None:
+                if self.times:
+                    self._schedule_lock = datafiles.try_lock(self.lock_file)
+                    if self._schedule_lock is None:
+                        # Another process runs the schedule; this one only serves trigger()
+                        self.times = []
+                with self._status_lock:
+                    self.status.update(times=[f"{h:02d}:{m:02d}" for h, m in self.times], scheduled_here=bool(self.times))
+                self._thread = threading.Thread(target=self._loop, name='nav-scheduler', daemon=True)
+                self._thread.start()
+        return self
+
+    def get_status(self):
+        with self._status_lock:
+            return dict(self.status, portfolios=dict(self.status['portfolios']), pending=sorted(self._pending))
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """The process-wide scheduler (created on first use; started by start() or the first trigger())."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            # Disabled: no scheduled runs, but triggered runs still happen in the background
+            _scheduler = Scheduler(times=REFRESH_TIMES if ENABLED else '')
+        return _scheduler
+
+if __name__ == '__main__':
+    # Standalone scheduled refreshes, for servers running several web worker processes
+    sched = get_scheduler().start()
+    if not sched.times:
+        raise SystemExit(f"Scheduled refreshes are disabled or already run by another process ({sched.lock_file})")
+    print(f"Scheduled refreshes at {', '.join(sched.status['times'])} (+ up to {sched.jitter_minutes:g} min)")
+    sched._thread.join()
@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Typed in-memory layout of the pipeline's tables. Identifiers and labels repeat on
+# every row (one ISIN per NAV day, one AMC per transaction), so they are held as
+# categoricals: one small integer code per row plus a single copy of each string.
+# Money and NAV values stay float64, since units x NAV is reported to the paisa.
+TXN_CATEGORICAL = ['Name', 'Investment Type', 'Fund Type', 'Investment Channel', 'Folio No', 'ISIN',
+                   'Advisor', 'Advisor Name', 'AMC']
+
+CATEGORICAL = {
+    'transactions': TXN_CATEGORICAL,
+    'lots': TXN_CATEGORICAL + ['Fund Name', 'gain_type'],
+    'realized_gains': ['Fund Name', 'ISIN', 'Type'],
+    'nav': ['isin', 'scheme_name'],
+}
+
+# Day counts fit comfortably in 32 bits
+INT32 = {
+    'lots': ['holding_days'],
+    'realized_gains': ['Days Held'],
+}
+
+NAV_DTYPES = {'isin': 'category', 'scheme_name': 'category', 'nav': 'float64'}
+
+def typed(df, table):
+    """Converts `df` to the compact dtypes of `table` in place; columns already typed are left alone."""
+    for col in CATEGORICAL.get(table, []):
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col in INT32.get(table, []):
+        if col in df.columns and df[col].dtype != 'int32' and df[col].notna().all():
+            df[col] = df[col].astype('int32')
+    return df
+
+def read_nav_csv(nav_csv):
+    """Reads the NAV store straight into its typed layout (no intermediate string columns)."""
+    # Dates are parsed via a categorical too: ~5k distinct days are parsed once each
+    # instead of materializing a million date strings first
+    df = pd.read_csv(nav_csv, dtype={**NAV_DTYPES, 'date': 'category'})
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    return df
+
+def memory_mb(df):
+    return round(df.memory_usage(deep=True).sum() / 2**20, 1)
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it can't be measured."""
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(rss / (2**20 if sys.platform == 'darwin' else 1024), 1) # bytes on macOS, kB on Linux
+    except ImportError:
+        pass
+    try:
+        import psutil # Optional, e.g. on Windows
+        return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+    except (ImportError, AttributeError):
+        return None
+
+# --- BENCHMARK ---
+_PROBE = """
+import sys, json
+sys.path.insert(0, {repo!r})
+import tracemalloc
+import pandas as pd
+import schema
+tracemalloc.start()
+if {typed!r}:
+    df = schema.read_nav_csv({path!r})
+else:
+    df = pd.read_csv({path!r})
+    df['date'] = pd.to_datetime(df['date'])
+held, peak = tracemalloc.get_traced_memory()
+print(json.dumps({{'rows': len(df), 'frame_mb': schema.memory_mb(df), 'held_mb': round(held / 2**20, 1),
+                  'load_peak_mb': round(peak / 2**20, 1), 'peak_rss_mb': schema.peak_rss_mb()}}))
+"""
+
+def make_nav_history(path, funds=200, years=20):
+    """Writes a synthetic NAV store: `funds` schemes with `years` of business-day NAVs."""
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=years * 261)
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(funds):
+        nav = 10 * np.exp(np.cumsum(rng.normal(0.0004, 0.01, len(dates))))
+        frames.append(pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'nav': nav.round(4),
+                                    'scheme_name': f"Synthetic Fund {i:03d} - Direct Plan - Growth Option",
+                                    'isin': f"INF{i:09d}"}))
+    pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+
+def bench(funds=200, years=20):
+    """Loads the same synthetic NAV history untyped and typed, each in a fresh interpreter."""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'nav.csv')
+        # Generated in a child process: Linux carries peak RSS across exec, so a large
+        # parent would inflate the children's readings
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--write', path, '--funds', str(funds), '--years', str(years)],
+                       check=True)
+        results = {}
+        for label, is_typed in [('untyped', False), ('typed', True)]:
+            out = subprocess.run([sys.executable, '-c', _PROBE.format(repo=repo, path=path, typed=is_typed)],
+                                 capture_output=True, text=True, check=True)
+            results[label] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    u, t = results['untyped'], results['typed']
+    print(f"NAV history: {funds} funds x {years} years = {u['rows']} rows")
+    for label, r in results.items():
+        print(f"  {label:8} held {r['held_mb']} MB, peak while loading {r['load_peak_mb']} MB, "
+              f"process peak RSS {r['peak_rss_mb'] or 'N/A'} MB")
+    print(f"  held memory reduction: {u['held_mb'] / t['held_mb']:.1f}x, loading peak reduction: {u['load_peak_mb'] / t['load_peak_mb']:.1f}x")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare memory of the untyped and typed NAV history layouts.")
+    parser.add_argument('--funds', type=int, default=200)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--write', metavar='PATH', help="Only write the synthetic NAV history to PATH")
+    args = parser.parse_args()
+    if args.write:
+        make_nav_history(args.write, args.funds, args.years)
+    else:
+        bench(args.funds, args.years)
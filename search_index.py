@@ -0,0 +1,224 @@
+import os
+import re
+import csv
+import json
+import bisect
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+import datafiles
+
+# CONFIGURATION
+INDEX_FILE = 'data/search_index.json'
+SCHEME_MASTER_CSV = datafiles.SCHEME_MASTER_CSV
+INDICES_CSV = datafiles.INDICES_CSV
+VERSION = 1
+MAX_PREFIX_EXPANSION = 200 # Vocabulary tokens a short prefix may expand to
+FIELD_WEIGHTS = {'id': 3.0, 'amc': 1.2, 'name': 1.0}
+MATCH_WEIGHTS = {'exact': 1.0, 'prefix': 0.8, 'fuzzy': 0.6}
+
+_TOKEN_PAT = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    return _TOKEN_PAT.findall(str(text).lower())
+
+def _trigrams(token):
+    padded = f"$${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance with adjacent transpositions, or limit + 1 once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+def _read_docs(scheme_master_csv, indices_csv):
+    """Searchable documents as columns: kind ('fund'/'index'), id (ISIN/ticker), name, code (scheme code/exchange)."""
+    docs = {'kind': [], 'id': [], 'name': [], 'code': []}
+    def add(kind, doc_id, name, code):
+        docs['kind'].append(kind); docs['id'].append(doc_id); docs['name'].append(name); docs['code'].append(code)
+
+    if os.path.exists(scheme_master_csv):
+        with open(scheme_master_csv, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                isin = row.get('isinGrowth') or row.get('isinDivReinvestment') or ''
+                if isin or row.get('schemeCode'):
+                    add('fund', isin, row.get('schemeName', ''), row.get('schemeCode', ''))
+    if os.path.exists(indices_csv):
+        seen = set()
+        with open(indices_csv, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('Ticker') and row['Ticker'] not in seen:
+                    seen.add(row['Ticker'])
+                    add('index', row['Ticker'], row.get('Name', ''), row.get('Exchange', ''))
+    return docs
+
+def build(scheme_master_csv=SCHEME_MASTER_CSV, indices_csv=INDICES_CSV, index_file=INDEX_FILE):
+    """
+    Builds the inverted index and writes it to `index_file` (atomically).
+
+    Postings are kept per field: 'id' (ISIN, ticker, scheme code), 'amc' (first word
+    of the scheme name) and 'name' (every name token). The sorted vocabulary answers
+    prefix queries by binary search, and a trigram map over the vocabulary finds
+    candidates for typo-tolerant matches.
+    """
+    docs = _read_docs(scheme_master_csv, indices_csv)
+    postings = {field: defaultdict(list) for field in FIELD_WEIGHTS}
+    for doc, (doc_id, name, code) in enumerate(zip(docs['id'], docs['name'], docs['code'])):
+        name_tokens = tokenize(name)
+        # Identifiers are indexed whole ('^NSEI' -> 'nsei'), so their parts don't match name words
+        for tok in dict.fromkeys(t for t in [''.join(tokenize(doc_id)), code.lower() if code.isdigit() else ''] if t):
+            postings['id'][tok].append(doc)
+        if name_tokens:
+            postings['amc'][name_tokens[0]].append(doc)
+        for tok in dict.fromkeys(name_tokens):
+            postings['name'][tok].append(doc)
+
+    vocab = sorted(set().union(*(p.keys() for p in postings.values())))
+    trigrams = defaultdict(list)
+    for i, tok in enumerate(vocab):
+        if tok in postings['name']: # Typos are only corrected in words, not in identifiers
+            for tri in _trigrams(tok):
+                trigrams[tri].append(i)
+
+    index = {
+        'version': VERSION,
+        'sources': {'scheme_master': datafiles.file_stamp(scheme_master_csv), 'indices': datafiles.file_stamp(indices_csv)},
+        'docs': docs,
+        'vocab': vocab,
+        'postings': {field: dict(p) for field, p in postings.items()},
+        'trigrams': dict(trigrams),
+    }
+    os.makedirs(os.path.dirname(index_file) or '.', exist_ok=True)
+    tmp = f"{index_file}.tmp"
+    with open(tmp, 'w') as f: json.dump(index, f, separators=(',', ':'))
+    os.replace(tmp, index_file)
+    return index
+
+class SearchIndex:
+    def __init__(self, index):
+        self.docs = index['docs']
+        self.vocab = index['vocab']
+        self.postings = index['postings']
+        self.trigrams = index['trigrams']
+        self.sources = index['sources']
+        self.n_docs = len(self.docs['id'])
+        self.kinds = np.array(self.docs['kind'])
+        self.name_len = np.array([len(n) for n in self.docs['name']], dtype=np.int32)
+        self._arrays = {} # Postings as index arrays, converted on first use
+
+    def _expand(self, token):
+        """[(vocab token, match kind, distance)] for one query token."""
+        matches = []
+        if len(token) >= 2 or token.isdigit():
+            lo = bisect.bisect_left(self.vocab, token)
+            hi = bisect.bisect_left(self.vocab, token + '￿')
+            for tok in self.vocab[lo:min(hi, lo + MAX_PREFIX_EXPANSION)]:
+                matches.append((tok, 'exact' if tok == token else 'prefix', 0))
+        elif token in self.postings['name'] or token in self.postings['id']:
+            matches.append((token, 'exact', 0))
+
+        if len(token) >= 4 and not any(kind == 'exact' for _, kind, _ in matches):
+            # Typo tolerance: vocabulary tokens sharing trigrams, within 1 edit (2 for long tokens)
+            limit = 1 if len(token) <= 6 else 2
+            shared = defaultdict(int)
+            for tri in _trigrams(token):
+                for i in self.trigrams.get(tri, ()):
+                    shared[i] += 1
+            known = {tok for tok, _, _ in matches}
+            for i in sorted(shared, key=shared.get, reverse=True)[:100]:
+                cand = self.vocab[i]
+                if cand in known:
+                    continue
+                # Compare against the candidate's prefix too, so a typo in a partly typed word still matches
+                dist = min(edit_distance(token, cand, limit), edit_distance(token, cand[:len(token)], limit))
+                if dist <= limit:
+                    matches.append((cand, 'fuzzy', dist))
+        return matches
+
+    def _docs_for(self, tok, field):
+        docs = self._arrays.get((field, tok))
+        if docs is None:
+            docs = self._arrays[(field, tok)] = np.asarray(self.postings[field].get(tok, ()), dtype=np.int32)
+        return docs
+
+    def _score(self, q_tokens):
+        """Per-doc arrays: how many query tokens each doc matches, and its total score."""
+        matched = np.zeros(self.n_docs, dtype=np.int16)
+        scores = np.zeros(self.n_docs)
+        for token in q_tokens:
+            weighted = []
+            for tok, match, dist in self._expand(token):
+                quality = MATCH_WEIGHTS[match] - 0.15 * dist
+                if match == 'prefix':
+                    quality *= len(token) / len(tok) * 0.5 + 0.5 # Longer completions rank lower
+                for field, weight in FIELD_WEIGHTS.items():
+                    # A partial identifier must be a good part of it ('INF879O'), not any prefix ('nifty')
+                    if field == 'id' and match == 'prefix' and (len(token) < 5 or 2 * len(token) < len(tok)):
+                        continue
+                    weighted.append((weight * quality, tok, field))
+            # Each doc keeps its best match for this token: assign in ascending score so better ones overwrite
+            best = np.zeros(self.n_docs)
+            for s, tok, field in sorted(weighted):
+                best[self._docs_for(tok, field)] = s
+            matched += best > 0
+            scores += best
+        return matched, scores
+
+    def search(self, query, kind=None, limit=20):
+        """Ranked matches for `query`; each result has kind, id, name, code and score."""
+        q_tokens = list(dict.fromkeys(tokenize(query)))
+        if not q_tokens:
+            return []
+        matched, scores = self._score(q_tokens)
+        # Docs matching every query token; if a word matches nothing, rank by how many matched
+        hits = matched == len(q_tokens)
+        if not hits.any():
+            hits = matched > 0
+        if kind is not None:
+            hits &= self.kinds == kind
+        docs = np.flatnonzero(hits)
+        if len(docs) > limit:
+            # Only the top `limit` by score need sorting (plus anything tied with the last of them)
+            cut = -np.partition(-(matched[docs] * 100 + scores[docs]), limit - 1)[limit - 1]
+            docs = docs[matched[docs] * 100 + scores[docs] >= cut]
+        docs = docs[np.lexsort((self.name_len[docs], -scores[docs], -matched[docs]))][:limit]
+
+        return [{'kind': self.docs['kind'][d], 'id': self.docs['id'][d], 'name': self.docs['name'][d],
+                 'code': self.docs['code'][d], 'score': round(float(scores[d]), 3), 'matched': int(matched[d]),
+                 'of': len(q_tokens)}
+                for d in docs.tolist()]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index(scheme_master_csv=SCHEME_MASTER_CSV, indices_csv=INDICES_CSV, index_file=INDEX_FILE):
+    """The search index, loaded from disk once and rebuilt when the scheme master or indices list changes."""
+    global _index
+    sources = {'scheme_master': datafiles.file_stamp(scheme_master_csv), 'indices': datafiles.file_stamp(indices_csv)}
+    with _index_lock:
+        if _index is not None and _index.sources == sources:
+            return _index
+        index = None
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, 'r') as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = None
+        if index is None or index.get('version') != VERSION or index.get('sources') != sources:
+            index = build(scheme_master_csv, indices_csv, index_file)
+        _index = SearchIndex(index)
+        return _index
@@ -24,6 +24,13 @@ let currentTaxFY = 'ALL';
 let currentGrowthRange = 'ALL';
 let currentTrendRange = 'ALL';
 
+// Portfolio namespace from ?portfolio=..., forwarded to every API call
+const currentPortfolio = new URLSearchParams(window.location.search).get('portfolio') || '';
+function apiUrl(path) {
+    if (!currentPortfolio) return path;
+    return `${path}${path.includes('?') ? '&' : '?'}portfolio=${encodeURIComponent(currentPortfolio)}`;
+}
+
 // Register Plugin and Globally Disable by Default
 if (typeof ChartDataLabels !== 'undefined') {
     Chart.register(ChartDataLabels);
@@ -32,15 +39,43 @@ if (typeof ChartDataLabels !== 'undefined') {
     });
 }
 
-document.addEventListener('DOMContentLoaded', async () => {
+async function loadDashboard() {
     try {
-        const response = await fetch('/api/data');
+        const response = await fetch(apiUrl('/api/data'));
+        if (response.status === 503) {
+            // Dashboard is being built in the background; poll until it is ready
+            document.getElementById('last-updated').textContent = 'Preparing dashboard...';
+            setTimeout(loadDashboard, 5000);
+            return;
+        }
         dashboardData = await response.json();
-        if (dashboardData.error) { console.error(dashboardData.error); return; }
+        if (dashboardData.error) {
+            // Unknown portfolio or a failed build: show why and stop polling
+            document.getElementById('last-updated').textContent = dashboardData.error;
+            console.error(dashboardData.error);
+            return;
+        }
         initializeDashboard();
         loadConfig();
+        loadRefreshStatus();
     } catch (error) { console.error('Failed to load dashboard data:', error); }
-});
+}
+
+// Shows when the background NAV refresh last ran and when it runs next
+async function loadRefreshStatus() {
+    try {
+        const status = await (await fetch('/api/status')).json();
+        const el = document.getElementById('last-updated');
+        const last = status.last_run;
+        const parts = [`Sync: ${dashboardData.last_updated}`];
+        if (last) parts.push(`Auto-refresh: ${last.finished_at.replace('T', ' ')}${last.ok ? '' : ' (failed)'}`);
+        if (status.next_run) parts.push(`Next: ${status.next_run.replace('T', ' ')}`);
+        el.textContent = parts.join(' | ');
+        if (last && last.error) el.title = last.error;
+    } catch (error) { console.error('Failed to load refresh status:', error); }
+}
+
+document.addEventListener('DOMContentLoaded', loadDashboard);
 
 // --- XIRR SOLVER (JS) ---
 // Newton-Raphson method for XIRR
@@ -776,28 +811,49 @@ function toggleYear(year) {
     renderInvestments();
 }
 
+// Filter state per investment cube dimension
+function cubeFilters() {
+    return { Category: selectedCategories, ActivityState: selectedActivities, AMC: selectedAMCs, Sector: selectedSectors, Cap: selectedCaps };
+}
+
+// Rows of the investment cube matching the active filters, plus their monthly totals.
+// A single dimension filter is answered straight from that dimension's precomputed rollup.
+function sliceInvestmentCube(cube) {
+    const filters = cubeFilters();
+    const activeDims = Object.keys(filters).filter(d => filters[d].length > 0);
+    const activeISINs = hideZero ? new Set(dashboardData.scheme_details.filter(s => s.current_val > 0).map(s => s.ISIN)) : null;
+
+    const rows = [];
+    cube.rows.ISIN.forEach((isin, r) => {
+        if (selectedSchemes.length > 0 && !selectedSchemes.includes(isin)) return;
+        if (activeISINs && !activeISINs.has(isin)) return;
+        if (activeDims.some(d => !filters[d].includes(cube.dims[d].labels[cube.dims[d].codes[r]]))) return;
+        rows.push(r);
+    });
+
+    let sources;
+    if (selectedSchemes.length === 0 && !activeISINs && activeDims.length === 0) sources = [cube.totals];
+    else if (selectedSchemes.length === 0 && !activeISINs && activeDims.length === 1) {
+        const dim = activeDims[0];
+        sources = cube.dims[dim].labels.map((l, i) => filters[dim].includes(l) ? cube.rollups[dim][i] : null).filter(Boolean);
+    } else sources = rows.map(r => cube.values[r]);
+
+    const monthTotals = cube.months.map(() => 0);
+    sources.forEach(vals => vals.forEach((v, i) => monthTotals[i] += v));
+    return { rows, monthTotals };
+}
+
 function renderInvestments() {
     if (!dashboardData.investment_summary) return;
-    const { pivot: allPivot, months: mKeys } = dashboardData.investment_summary;
+    const cube = dashboardData.investment_summary;
+    const mKeys = cube.months;
 
-    // A. FILTER DATA
-    let filteredPivot = allPivot;
-    if (selectedCategories.length > 0) filteredPivot = filteredPivot.filter(p => selectedCategories.includes(p.Category));
-    if (selectedActivities.length > 0) filteredPivot = filteredPivot.filter(p => selectedActivities.includes(p.ActivityState));
-    if (selectedAMCs.length > 0) filteredPivot = filteredPivot.filter(p => selectedAMCs.includes(p.AMC));
-    if (selectedSectors.length > 0) filteredPivot = filteredPivot.filter(p => selectedSectors.includes(p.Sector));
-    if (selectedCaps.length > 0) filteredPivot = filteredPivot.filter(p => selectedCaps.includes(p.Cap));
-    if (selectedSchemes.length > 0) filteredPivot = filteredPivot.filter(p => selectedSchemes.includes(p.ISIN));
-
-    if (hideZero) {
-        const activeISINs = new Set(dashboardData.scheme_details.filter(s => s.current_val > 0).map(s => s.ISIN));
-        filteredPivot = filteredPivot.filter(p => activeISINs.has(p.ISIN));
-    }
+    // A. SLICE THE CUBE
+    const { rows, monthTotals } = sliceInvestmentCube(cube);
 
-    // B. RE-CALCULATE TOTALS FOR GRAPH BASED ON FILTERED DATA
+    // B. TOTALS FOR GRAPH
     const totalsMap = {};
-    mKeys.forEach(mk => totalsMap[mk] = 0);
-    filteredPivot.forEach(p => totalsMap[p.DateKey] += p.Amount);
+    mKeys.forEach((mk, i) => totalsMap[mk] = monthTotals[i]);
 
     const totalsData = mKeys.map((mk, idx) => {
         const amt = totalsMap[mk];
@@ -876,19 +932,36 @@ function renderInvestments() {
     const body = document.getElementById('investment-pivot-body');
     if (!head || !body) return;
 
-    // Data Processing for Pivot
-    const years = [...new Set(filteredPivot.map(p => p.Year))].sort();
-    const fundsSet = new Set(filteredPivot.map(p => p['Fund Name']));
-    const fundsMap = {}; // [fund][year][month] = amount
+    const ALL_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
 
-    filteredPivot.forEach(p => {
-        if (!fundsMap[p['Fund Name']]) fundsMap[p['Fund Name']] = {};
-        if (!fundsMap[p['Fund Name']][p.Year]) fundsMap[p['Fund Name']][p.Year] = { total: 0, months: {} };
-        fundsMap[p['Fund Name']][p.Year].months[p.Month] = p.Amount;
-        fundsMap[p['Fund Name']][p.Year].total += p.Amount;
+    // Data Processing for Pivot (funds sharing a name are shown as one row). Year and overall
+    // totals come precomputed per cube row; months are only read for expanded years.
+    const yearMonths = cube.years.map(() => []);
+    cube.month_year.forEach((y, i) => yearMonths[y].push(i));
+    const fundsSet = new Set(rows.map(r => cube.rows['Fund Name'][r]));
+    const fundsMap = {}; // [fund] = { overall, years: { [year]: { total, months } } }
+    const yearSet = new Set();
+
+    rows.forEach(r => {
+        const fName = cube.rows['Fund Name'][r];
+        const fund = fundsMap[fName] || (fundsMap[fName] = { overall: 0, years: {} });
+        fund.overall += cube.row_totals[r];
+        cube.by_year[r].forEach((total, y) => {
+            if (total === 0) return;
+            const yr = cube.years[y];
+            yearSet.add(yr);
+            const data = fund.years[yr] || (fund.years[yr] = { total: 0, months: {} });
+            data.total += total;
+            if (!expandedYears.has(yr)) return;
+            yearMonths[y].forEach(i => {
+                const amt = cube.values[r][i];
+                if (amt === 0) return;
+                const m = ALL_MONTHS[parseInt(mKeys[i].slice(5)) - 1];
+                data.months[m] = (data.months[m] || 0) + amt;
+            });
+        });
     });
-
-    const ALL_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
+    const years = [...yearSet].sort();
 
     // Header Construction
     let row1 = `<th class="sticky-col">Fund Name</th>`;
@@ -916,13 +989,11 @@ function renderInvestments() {
     const sortedFunds = [...fundsSet].sort();
     body.innerHTML = sortedFunds.map(fName => {
         let cells = `<td class="sticky-col">${fName}</td>`;
-        let overallTotal = 0;
         let prevPeriodAmount = 0; // For trend coloring
 
         years.forEach((yr, yIdx) => {
-            const data = fundsMap[fName][yr] || { total: 0, months: {} };
+            const data = fundsMap[fName].years[yr] || { total: 0, months: {} };
             const isExp = expandedYears.has(yr);
-            overallTotal += data.total;
 
             if (isExp) {
                 // Color coding logic for months
@@ -952,12 +1023,13 @@ function renderInvestments() {
             }
         });
 
-        cells += `<td class="row-total-col" style="text-align:right">${fmtPrice(overallTotal)}</td>`;
+        cells += `<td class="row-total-col" style="text-align:right">${fmtPrice(fundsMap[fName].overall)}</td>`;
         return `<tr>${cells}</tr>`;
-    }).join('') + renderColumnTotals(years, fundsMap, ALL_MONTHS);
+    }).join('') + renderColumnTotals(years, cube, yearMonths, monthTotals, ALL_MONTHS);
 }
 
-function renderColumnTotals(years, fundsMap, ALL_MONTHS) {
+// Grand totals row, from the slice's monthly totals (no second pass over the funds)
+function renderColumnTotals(years, cube, yearMonths, monthTotals, ALL_MONTHS) {
     let cells = `<td class="sticky-col total-cell">GRAND TOTAL</td>`;
     let grandTotal = 0;
 
@@ -967,11 +1039,9 @@ function renderColumnTotals(years, fundsMap, ALL_MONTHS) {
         const mTotals = {};
         ALL_MONTHS.forEach(m => mTotals[m] = 0);
 
-        Object.values(fundsMap).forEach(fData => {
-            if (fData[yr]) {
-                yrTotal += fData[yr].total;
-                ALL_MONTHS.forEach(m => mTotals[m] += (fData[yr].months[m] || 0));
-            }
+        yearMonths[cube.years.indexOf(yr)].forEach(i => {
+            yrTotal += monthTotals[i];
+            mTotals[ALL_MONTHS[parseInt(cube.months[i].slice(5)) - 1]] += monthTotals[i];
         });
 
         grandTotal += yrTotal;
@@ -1339,7 +1409,7 @@ async function refreshNAV() {
     showStatus("Fetching latest NAV data. This may take a minute...", "info");
 
     try {
-        const res = await fetch('/api/refresh/nav', { method: 'POST' });
+        const res = await fetch(apiUrl('/api/refresh/nav'), { method: 'POST' });
         const result = await res.json();
         if (result.status === 'success') {
             showStatus("NAV Refresh Complete. Reloading data...", "success");
@@ -1394,7 +1464,7 @@ async function handleFileUpload() {
     formData.append('password', password);
 
     try {
-        const res = await fetch('/api/upload', {
+        const res = await fetch(apiUrl('/api/upload'), {
             method: 'POST',
             body: formData
         });
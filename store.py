@@ -0,0 +1,229 @@
+import os
+import sqlite3
+
+import pandas as pd
+
+import schema
+import datafiles
+
+# CONFIGURATION
+DB_PATH = datafiles.DB_PATH
+DEFAULT_PORTFOLIO = datafiles.DEFAULT_PORTFOLIO
+
+# Table layouts: (DataFrame column, SQL column, SQL type). Dates are stored as ISO
+# 'YYYY-MM-DD' text so that lexical order is chronological and range scans use the index.
+TXN_COLUMNS = [
+    ('Name', 'name', 'TEXT'),
+    ('Date', 'date', 'DATE'),
+    ('Amount', 'amount', 'REAL'),
+    ('Units', 'units', 'REAL'),
+    ('Price', 'price', 'REAL'),
+    ('Unit_balance', 'unit_balance', 'REAL'),
+    ('Investment Type', 'investment_type', 'TEXT'),
+    ('Fund Type', 'fund_type', 'TEXT'),
+    ('Investment Channel', 'investment_channel', 'TEXT'),
+    ('Folio No', 'folio_no', 'TEXT'),
+    ('ISIN', 'isin', 'TEXT'),
+    ('Advisor', 'advisor', 'TEXT'),
+    ('Advisor Name', 'advisor_name', 'TEXT'),
+    ('AMC', 'amc', 'TEXT'),
+    ('Remarks', 'remarks', 'TEXT'),
+]
+
+TABLES = {
+    'transactions': TXN_COLUMNS,
+    'lots': TXN_COLUMNS + [
+        ('Fund Name', 'fund_name', 'TEXT'),
+        ('date_last', 'date_last', 'DATE'),
+        ('nav_last', 'nav_last', 'REAL'),
+        ('units_left', 'units_left', 'REAL'),
+        ('current_val', 'current_val', 'REAL'),
+        ('invested_val', 'invested_val', 'REAL'),
+        ('unrealized_gain', 'unrealized_gain', 'REAL'),
+        ('holding_days', 'holding_days', 'INTEGER'),
+        ('gain_type', 'gain_type', 'TEXT'),
+    ],
+    'realized_gains': [
+        ('Fund Name', 'fund_name', 'TEXT'),
+        ('ISIN', 'isin', 'TEXT'),
+        ('Buy Date', 'buy_date', 'DATE'),
+        ('Sell Date', 'sell_date', 'DATE'),
+        ('Units', 'units', 'REAL'),
+        ('Buy Price', 'buy_price', 'REAL'),
+        ('Sell Price', 'sell_price', 'REAL'),
+        ('Gain', 'gain', 'REAL'),
+        ('Type', 'type', 'TEXT'),
+        ('Days Held', 'days_held', 'INTEGER'),
+    ],
+}
+
+# Date column used for range reads on each table
+DATE_KEYS = {'transactions': 'date', 'lots': 'date', 'realized_gains': 'sell_date'}
+
+def _schema():
+    stmts = []
+    for table, cols in TABLES.items():
+        col_sql = ', '.join(f"{sql} {typ}" for _, sql, typ in cols)
+        stmts.append(f"CREATE TABLE IF NOT EXISTS {table} (portfolio TEXT NOT NULL, {col_sql})")
+        stmts.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_isin ON {table} (portfolio, isin, {DATE_KEYS[table]})")
+        stmts.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_date ON {table} (portfolio, {DATE_KEYS[table]})")
+    stmts.append("DROP TABLE IF EXISTS props") # Mirror of mf-props.csv in older databases; props.py reads the CSV
+    stmts.append("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return stmts
+
+def connect(db_path=DB_PATH):
+    """Opens the pipeline database in WAL mode, creating the schema on first use."""
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        for stmt in _schema():
+            conn.execute(stmt)
+    return conn
+
+def _to_rows(df, cols, portfolio):
+    """Converts a DataFrame to insert tuples, formatting dates and mapping NaN to NULL."""
+    out = pd.DataFrame(index=df.index)
+    for df_col, sql, typ in cols:
+        if df_col not in df.columns:
+            out[sql] = None
+            continue
+        s = df[df_col]
+        if typ == 'DATE':
+            s = pd.to_datetime(s).dt.strftime('%Y-%m-%d')
+        out[sql] = s
+    out = out.astype(object).where(out.notna(), None)
+    return [(portfolio, *row) for row in out.itertuples(index=False, name=None)]
+
+def _from_rows(cursor, cols):
+    names = {sql: (df_col, typ) for df_col, sql, typ in cols}
+    sql_cols = [d[0] for d in cursor.description]
+    df = pd.DataFrame(cursor.fetchall(), columns=sql_cols)
+    for sql in sql_cols:
+        if names[sql][1] == 'DATE':
+            df[sql] = pd.to_datetime(df[sql], format='%Y-%m-%d')
+        elif names[sql][1] == 'REAL':
+            df[sql] = pd.to_numeric(df[sql])
+    return df.rename(columns={sql: names[sql][0] for sql in sql_cols})
+
+def write_table(table, df, portfolio=DEFAULT_PORTFOLIO, conn=None, since=None):
+    """
+    Replaces a portfolio's rows in `table` with `df` in a single transaction.
+
+    If `since` is given, only rows on/after that date are replaced (older history is kept).
+    """
+    cols = TABLES[table]
+    own = conn is None
+    conn = conn or connect()
+    try:
+        rows = _to_rows(df, cols, portfolio)
+        placeholders = ', '.join('?' * (len(cols) + 1))
+        with conn:
+            if since is None:
+                conn.execute(f"DELETE FROM {table} WHERE portfolio = ?", (portfolio,))
+            else:
+                conn.execute(f"DELETE FROM {table} WHERE portfolio = ? AND {DATE_KEYS[table]} >= ?",
+                             (portfolio, pd.Timestamp(since).strftime('%Y-%m-%d')))
+            conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+            # Monotonic per-table version, used by the pipeline runner to fingerprint inputs
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, '1') "
+                         "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (f"version:{table}:{portfolio}",))
+    finally:
+        if own: conn.close()
+
+def table_version(table, portfolio=DEFAULT_PORTFOLIO, conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        return int(get_meta(f"version:{table}:{portfolio}", conn) or 0)
+    finally:
+        if own: conn.close()
+
+def read_table(table, portfolio=DEFAULT_PORTFOLIO, isin=None, start=None, end=None, conn=None):
+    """Reads a portfolio's rows, optionally restricted to ISIN(s) and a date range (inclusive)."""
+    cols = TABLES[table]
+    date_key = DATE_KEYS[table]
+    where, args = ["portfolio = ?"], [portfolio]
+    if isin is not None:
+        isins = [isin] if isinstance(isin, str) else list(isin)
+        where.append(f"isin IN ({', '.join('?' * len(isins))})")
+        args.extend(isins)
+    if start is not None:
+        where.append(f"{date_key} >= ?")
+        args.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        where.append(f"{date_key} <= ?")
+        args.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+
+    own = conn is None
+    conn = conn or connect()
+    try:
+        select = ', '.join(sql for _, sql, _ in cols)
+        cur = conn.execute(f"SELECT {select} FROM {table} WHERE {' AND '.join(where)} ORDER BY rowid", args)
+        return schema.typed(_from_rows(cur, cols), table)
+    finally:
+        if own: conn.close()
+
+def has_rows(table, portfolio=DEFAULT_PORTFOLIO, conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        return conn.execute(f"SELECT 1 FROM {table} WHERE portfolio = ? LIMIT 1", (portfolio,)).fetchone() is not None
+    finally:
+        if own: conn.close()
+
+def _parse_legacy_dates(s, dayfirst):
+    """
+    Dates of a legacy CSV column. ISO 'YYYY-MM-DD' values (what the pipeline wrote) are parsed
+    as such; only other layouts ('05-Feb-2019', '05-02-2019') are read day first.
+    """
+    iso = s.astype('string').str.match(r'\d{4}-\d{2}-\d{2}', na=False)
+    parts = [pd.to_datetime(s[iso], format='ISO8601'), pd.to_datetime(s[~iso], format='mixed', dayfirst=dayfirst)]
+    return pd.concat([p for p in parts if not p.empty] or parts[:1]).reindex(s.index)
+
+def import_csv(table, csv_path, portfolio=DEFAULT_PORTFOLIO, conn=None):
+    """One-off migration of a legacy CSV artifact into the store."""
+    df = pd.read_csv(csv_path)
+    for df_col, _, typ in TABLES[table]:
+        if typ == 'DATE' and df_col in df.columns:
+            df[df_col] = _parse_legacy_dates(df[df_col], dayfirst=(table == 'transactions'))
+    write_table(table, df, portfolio, conn=conn)
+    return df
+
+def ensure_imported(table, portfolio=DEFAULT_PORTFOLIO, csv_path=None, conn=None):
+    """Imports `csv_path` if the portfolio has no rows in `table` yet."""
+    if not has_rows(table, portfolio, conn=conn) and csv_path and os.path.exists(csv_path):
+        import_csv(table, csv_path, portfolio, conn=conn)
+
+def load_table(table, portfolio=DEFAULT_PORTFOLIO, csv_fallback=None, conn=None, **filters):
+    """Reads from the store, importing `csv_fallback` first if the portfolio has no rows yet."""
+    ensure_imported(table, portfolio, csv_fallback, conn=conn)
+    return read_table(table, portfolio, conn=conn, **filters)
+
+def list_portfolios(conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        return [r[0] for r in conn.execute("SELECT DISTINCT portfolio FROM transactions")]
+    finally:
+        if own: conn.close()
+
+def read_funds(portfolios, conn=None):
+    """Distinct (ISIN, Name) pairs held across the given portfolios."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        cur = conn.execute(f"SELECT isin, name FROM transactions WHERE portfolio IN ({', '.join('?' * len(portfolios))}) GROUP BY isin",
+                           list(portfolios))
+        return pd.DataFrame(cur.fetchall(), columns=['ISIN', 'Name'])
+    finally:
+        if own: conn.close()
+
+# --- META ---
+def get_meta(key, conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def set_meta(key, value, conn):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
@@ -0,0 +1,188 @@
+import hashlib
+from datetime import date, timedelta
+
+import pandas as pd
+
+import store
+
+# CONFIGURATION
+LT_HOLDING_DAYS = 365 # Units held longer than this are long-term (same rule as processor.run_fifo)
+
+_SCHEMA = [
+    # One row per purchase; units_left is drawn down FIFO by redemptions. lt_date is the day the
+    # lot completes LT_HOLDING_DAYS: gains on units sold after it are long-term.
+    """CREATE TABLE IF NOT EXISTS tax_lots (portfolio TEXT NOT NULL, lot_id INTEGER NOT NULL, isin TEXT, fund_name TEXT,
+       amc TEXT, buy_date DATE, price REAL, units REAL, units_left REAL, buy_fy INTEGER, lt_date DATE,
+       PRIMARY KEY (portfolio, lot_id))""",
+    # FIFO order within a fund, and open lots sorted by LTCG-eligibility date
+    "CREATE INDEX IF NOT EXISTS idx_tax_lots_isin ON tax_lots (portfolio, isin, lot_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tax_lots_lt ON tax_lots (portfolio, lt_date) WHERE units_left > 0",
+    """CREATE TABLE IF NOT EXISTS tax_disposals (portfolio TEXT NOT NULL, lot_id INTEGER, isin TEXT, fund_name TEXT,
+       buy_date DATE, sell_date DATE, units REAL, buy_price REAL, sell_price REAL, gain REAL, type TEXT,
+       days_held INTEGER, fy INTEGER)""",
+    "CREATE INDEX IF NOT EXISTS idx_tax_disposals_fy ON tax_disposals (portfolio, fy)",
+    # Realized gains pre-aggregated per financial year, fund and STCG/LTCG
+    """CREATE TABLE IF NOT EXISTS tax_fy (portfolio TEXT NOT NULL, fy INTEGER NOT NULL, isin TEXT NOT NULL, type TEXT NOT NULL,
+       gain REAL, units REAL, disposals INTEGER, PRIMARY KEY (portfolio, fy, isin, type))""",
+]
+
+def fy_of(d):
+    """Indian financial year (April-March) containing `d`, as its starting year: 2024 = FY2024-25."""
+    return d.year if d.month >= 4 else d.year - 1
+
+def fy_label(fy):
+    return f"FY{fy}-{(fy + 1) % 100:02d}"
+
+def _events(cams_df):
+    """Transactions in ledger order (by date, purchases before same-day redemptions) as tuples."""
+    df = cams_df[['Date', 'Investment Type', 'ISIN', 'Name', 'AMC', 'Units', 'Price']].copy()
+    df['is_red'] = df['Investment Type'] == 'Redemption'
+    df = df.sort_values(['Date', 'is_red'], kind='stable')
+    return [(d.date(), bool(red), str(isin), name, amc, float(units), float(price))
+            for d, red, isin, name, amc, units, price in zip(df['Date'], df['is_red'], df['ISIN'], df['Name'], df['AMC'], df['Units'], df['Price'])]
+
+def _chain(events):
+    """Running digest after each event; a matching digest at n means the first n events are unchanged."""
+    digests, h = [], ''
+    for ev in events:
+        h = hashlib.sha1(f"{h}|{ev!r}".encode()).hexdigest()
+        digests.append(h)
+    return digests
+
+class TaxLedger:
+    """
+    Persistent FIFO tax-lot ledger of one portfolio, kept in the pipeline database.
+
+    New transactions are applied on top of the stored state: the ledger records how
+    many transactions it has consumed and a running digest of them, so a statement
+    that only appends replays just the new rows, while one that rewrites history
+    rebuilds the ledger. Realized gains are bucketed per financial year as they are
+    booked, and open lots are indexed by the date they turn long-term, so FY summaries
+    and "turning long-term in the next N days" are index range reads.
+    """
+    def __init__(self, portfolio=store.DEFAULT_PORTFOLIO, db_path=store.DB_PATH):
+        self.portfolio = portfolio
+        self.db_path = db_path
+        self._meta_key = f"taxlots:{portfolio}"
+
+    def _connect(self):
+        conn = store.connect(self.db_path)
+        with conn:
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+        return conn
+
+    def sync(self, cams_df=None):
+        """Brings the ledger up to date with the portfolio's transactions; returns the number of events applied."""
+        conn = self._connect()
+        try:
+            with conn:
+                # Take the write lock before reading the state, so that concurrent syncs (any
+                # process) run one after the other and each event is applied once
+                conn.execute("BEGIN IMMEDIATE")
+                if cams_df is None:
+                    cams_df = store.read_table('transactions', self.portfolio, conn=conn)
+                events = _events(cams_df) if not cams_df.empty else []
+                digests = _chain(events)
+                state = store.get_meta(self._meta_key, conn)
+                done, digest = (int(state.split(':')[0]), state.split(':')[1]) if state else (0, '')
+
+                if done > len(events) or (done and digests[done - 1] != digest):
+                    # History was rewritten (e.g. a statement with back-dated rows): replay everything
+                    for table in ('tax_lots', 'tax_disposals', 'tax_fy'):
+                        conn.execute(f"DELETE FROM {table} WHERE portfolio = ?", (self.portfolio,))
+                    done = 0
+                if done < len(events):
+                    self._apply(conn, events[done:])
+                    store.set_meta(self._meta_key, f"{len(events)}:{digests[-1]}", conn)
+                elif not events:
+                    store.set_meta(self._meta_key, "0:", conn)
+            return len(events) - done
+        finally:
+            conn.close()
+
+    def _apply(self, conn, events):
+        p = self.portfolio
+        next_id = conn.execute("SELECT COALESCE(MAX(lot_id), 0) + 1 FROM tax_lots WHERE portfolio = ?", (p,)).fetchone()[0]
+        open_lots = {} # isin -> [[lot_id, units_left, buy_date, price], ...] in FIFO order, loaded on first use
+        new_lots, touched, disposals, buckets = [], {}, [], {}
+
+        def lots_of(isin):
+            if isin not in open_lots:
+                cur = conn.execute("SELECT lot_id, units_left, buy_date, price FROM tax_lots "
+                                   "WHERE portfolio = ? AND isin = ? AND units_left > 0 ORDER BY lot_id", (p, isin))
+                open_lots[isin] = [[lot_id, left, date.fromisoformat(d), price] for lot_id, left, d, price in cur]
+            return open_lots[isin]
+
+        for d, is_red, isin, name, amc, units, price in events:
+            if not is_red:
+                lots = lots_of(isin)
+                new_lots.append((p, next_id, isin, name, amc, d.isoformat(), price, units, units, fy_of(d),
+                                 (d + timedelta(days=LT_HOLDING_DAYS)).isoformat()))
+                if units > 0: lots.append([next_id, units, d, price])
+                next_id += 1
+                continue
+            to_redeem = abs(units)
+            for lot in lots_of(isin):
+                if to_redeem <= 0: break
+                if lot[1] <= 0: continue
+                redeemed = min(lot[1], to_redeem)
+                lot[1] -= redeemed
+                to_redeem -= redeemed
+                touched[lot[0]] = lot
+                days_held = (d - lot[2]).days
+                gain_type = 'LTCG' if days_held > LT_HOLDING_DAYS else 'STCG'
+                gain = (price - lot[3]) * redeemed
+                disposals.append((p, lot[0], isin, name, lot[2].isoformat(), d.isoformat(), redeemed, lot[3], price, gain,
+                                  gain_type, days_held, fy_of(d)))
+                b = buckets.setdefault((fy_of(d), isin, gain_type), [0.0, 0.0, 0])
+                b[0] += gain; b[1] += redeemed; b[2] += 1
+
+        conn.executemany("INSERT INTO tax_lots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", new_lots)
+        conn.executemany("UPDATE tax_lots SET units_left = ? WHERE portfolio = ? AND lot_id = ?",
+                         [(lot[1], p, lot_id) for lot_id, lot in touched.items()])
+        conn.executemany("INSERT INTO tax_disposals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", disposals)
+        conn.executemany("INSERT INTO tax_fy VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (portfolio, fy, isin, type) DO UPDATE SET "
+                         "gain = gain + excluded.gain, units = units + excluded.units, disposals = disposals + excluded.disposals",
+                         [(p, fy, isin, t, g, u, n) for (fy, isin, t), (g, u, n) in buckets.items()])
+
+    def fy_buckets(self, start_fy=None, end_fy=None):
+        """Realized gains per (fy, isin, type), optionally for a range of financial years (inclusive)."""
+        where, args = ["portfolio = ?"], [self.portfolio]
+        if start_fy is not None:
+            where.append("fy >= ?"); args.append(start_fy)
+        if end_fy is not None:
+            where.append("fy <= ?"); args.append(end_fy)
+        conn = self._connect()
+        try:
+            cur = conn.execute(f"SELECT fy, isin, type, gain, units, disposals FROM tax_fy WHERE {' AND '.join(where)} ORDER BY fy, isin, type", args)
+            return pd.DataFrame(cur.fetchall(), columns=['fy', 'isin', 'type', 'gain', 'units', 'disposals'])
+        finally:
+            conn.close()
+
+    def fy_summary(self, start_fy=None, end_fy=None):
+        """{'FY2024-25': {'stcg': ..., 'ltcg': ...}, ...} for the financial years that had sales."""
+        summary = {}
+        for (fy, t), gain in self.fy_buckets(start_fy, end_fy).groupby(['fy', 'type'])['gain'].sum().items():
+            summary.setdefault(fy_label(fy), {'stcg': 0.0, 'ltcg': 0.0})[t.lower()] = round(gain, 2)
+        return summary
+
+    def turning_long_term(self, within_days, today=None):
+        """Open lots that turn long-term after `today` and within `within_days` days, soonest first."""
+        today = today or date.today()
+        conn = self._connect()
+        try:
+            cur = conn.execute("SELECT lot_id, isin, fund_name, amc, buy_date, lt_date, price, units_left FROM tax_lots "
+                               "WHERE portfolio = ? AND units_left > 0 AND lt_date > ? AND lt_date <= ? ORDER BY lt_date, lot_id",
+                               (self.portfolio, today.isoformat(), (today + timedelta(days=within_days)).isoformat()))
+            lots = pd.DataFrame(cur.fetchall(), columns=['lot_id', 'isin', 'fund_name', 'amc', 'buy_date', 'lt_date', 'price', 'units_left'])
+        finally:
+            conn.close()
+        lots['days_left'] = [(date.fromisoformat(d) - today).days for d in lots['lt_date']]
+        return lots
+
+def get_ledger(portfolio=store.DEFAULT_PORTFOLIO, cams_df=None):
+    """The portfolio's tax-lot ledger, synced with its transactions (or `cams_df` if given)."""
+    ledger = TaxLedger(portfolio)
+    ledger.sync(cams_df)
+    return ledger